@@ -1,375 +1,33 @@
+import bootstrap
 import streamlit as st
-import asyncio
-from playwright.async_api import async_playwright
-import time
-import random
-import sys
-import xml.etree.ElementTree as ET
-import os
-import subprocess
 import re
-import json
-from datetime import datetime, timedelta
-import email.utils
-
-# ===========================
-# 🛠️ 自動安裝 requests
-# ===========================
-try:
-    import requests
-except ImportError:
-    subprocess.run([sys.executable, "-m", "pip", "install", "requests"], check=True)
-    import requests
-
-# ===========================
-# 0. 環境準備
-# ===========================
-try:
-    subprocess.run(["playwright", "install", "chromium"], check=True)
-except Exception:
-    pass
-
-if sys.platform.startswith("win"):
-    asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
+import time
+from datetime import datetime
+
+import numpy as np
+
+from archive import get_archive
+from async_runtime import iterate_sync, run_sync
+from dedup import dedupe_news
+from metrics import get_metrics
+from news_cache import format_age, get_news_cache
+from prefetch import get_prefetcher
+from scrapers import SOURCE_NAMES, stream_news
+from score_memo import get_score_memo
+from service_client import ANALYSIS_SERVICE_URL, SERVICE_ERRORS, get_service_client
+from scoring import calculate_score_keyword_fallback, stream_with_gemini
+from stock_index import get_stock_index, resolve_stock_info
+from timeseries import ROLLING_WINDOW, SOURCE_LABELS, get_score_series
+
+APP_VERSION = "V15.7"
+bootstrap.mark("imports")
+bootstrap.prepare_in_background()
 
 # ===========================
 # 🔐 資安核心
 # ===========================
 SYSTEM_API_KEY = st.secrets.get("GEMINI_API_KEY", None)
 
-# ===========================
-# 1. 股票資料庫
-# ===========================
-BASE_STOCKS = {
-    "台積電": "2330", "聯電": "2303", "鴻海": "2317", "聯發科": "2454", "長榮": "2603",
-    "陽明": "2609", "萬海": "2615", "中鋼": "2002", "中鴻": "2014", "台塑": "1301",
-    "南亞": "1303", "台化": "1326", "台塑化": "6505", "國泰金": "2882", "富邦金": "2881",
-    "中信金": "2891", "玉山金": "2884", "元大金": "2885", "兆豐金": "2886", "台泥": "1101",
-    "緯創": "3231", "廣達": "2382", "英業達": "2356", "仁寶": "2324", "和碩": "4938",
-    "技嘉": "2376", "微星": "2377", "華碩": "2357", "宏碁": "2353", "光寶科": "2301",
-    "群創": "3481", "友達": "2409", "彩晶": "6116", "聯詠": "3034", "瑞昱": "2379",
-    "台達電": "2308", "日月光": "3711", "力積電": "6770", "世界": "5347", "元太": "8069",
-    "智原": "3035", "創意": "3443", "世芯": "3661", "愛普": "6531", "祥碩": "5269",
-    "長榮航": "2618", "華航": "2610", "高鐵": "2633", "裕隆": "2201", "和泰車": "2207",
-    "統一超": "2912", "全家": "5903", "中華電": "2412", "台灣大": "3045", "遠傳": "4904",
-    "開發金": "2883", "新光金": "2888", "永豐金": "2890", "台新金": "2887", "合庫金": "5880",
-    "第一金": "2892", "華南金": "2880", "彰銀": "2801", "臺企銀": "2834", "上海商銀": "5876",
-    "元大台灣50": "0050", "元大高股息": "0056", "國泰永續高股息": "00878", "復華台灣科技優息": "00929",
-    "群益台灣精選高息": "00919", "元大美債20年": "00679B", "統一台灣高息動能": "00939", "元大台灣價值高息": "00940",
-    "力積電": "6770"
-}
-
-# ===========================
-# 2. 爬蟲模組 (維持 V15.6 的精兵策略)
-# ===========================
-USER_AGENTS = [
-    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36"
-]
-def get_ua(): return random.choice(USER_AGENTS)
-
-def is_within_3_days(date_obj):
-    if not date_obj: return True
-    now = datetime.now(date_obj.tzinfo)
-    delta = now - date_obj
-    return delta.days <= 3
-
-async def sync_market_data():
-    full_stock_dict = BASE_STOCKS.copy()
-    try:
-        async with async_playwright() as p:
-            browser = await p.chromium.launch(headless=True)
-            context = await browser.new_context(user_agent=get_ua())
-            try:
-                api_url = "https://scanner.tradingview.com/taiwan/scan"
-                payload = {
-                    "columns": ["name", "description", "volume"],
-                    "ignore_unknown_fields": False,
-                    "options": {"lang": "zh_TW"},
-                    "range": [0, 1500],
-                    "sort": {"sortBy": "volume", "sortOrder": "desc"},
-                    "symbols": {"query": {"types": []}, "tickers": []},
-                    "filter": [{"left": "type", "operation": "in_range", "right": ["stock", "dr", "fund"]}]
-                }
-                resp = requests.post(api_url, json=payload, timeout=5)
-                if resp.status_code == 200:
-                    data = resp.json()
-                    for item in data.get('data', []):
-                        code = item['d'][0]
-                        name = item['d'][1].replace("KY", "").strip()
-                        full_stock_dict[name] = code
-            except: pass
-            await browser.close()
-    except Exception: pass
-    return full_stock_dict, len(full_stock_dict)
-
-async def resolve_stock_info(user_input, stock_dict):
-    clean_input = user_input.strip().upper()
-    for name, code in stock_dict.items():
-        if clean_input == name or clean_input == code: return code, name
-    for name, code in stock_dict.items():
-        if clean_input in name: return code, name
-    
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
-        try:
-            page = await browser.new_page(user_agent=get_ua())
-            encoded = requests.utils.quote(clean_input)
-            await page.goto(f"https://tw.stock.yahoo.com/search?p={encoded}", timeout=8000)
-            link = page.locator("a[href*='/quote/']").first
-            if await link.count() > 0:
-                text = await link.inner_text()
-                href = await link.get_attribute("href")
-                match = re.search(r"(\d{4,6})", href)
-                if match:
-                    code = match.group(1)
-                    name = text.split("\n")[0].strip()
-                    if name == code or not name: name = clean_input
-                    return code, name
-        except: pass
-        finally: await browser.close()
-    return None, None
-
-async def fetch_google_rss(stock_code, site_domain, source_name):
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
-        context = await browser.new_context(user_agent=get_ua())
-        page = await context.new_page()
-        try:
-            rss_url = f"https://news.google.com/rss/search?q={stock_code}+site:{site_domain}&hl=zh-TW&gl=TW&ceid=TW:zh-Hant"
-            response = await page.goto(rss_url, timeout=20000, wait_until="commit")
-            xml_content = await response.text()
-            root = ET.fromstring(xml_content)
-            data = []
-            
-            for item in root.findall('.//item'):
-                title = item.find('title').text
-                link = item.find('link').text if item.find('link') is not None else None
-                pub_date_str = item.find('pubDate').text if item.find('pubDate') is not None else None
-                
-                is_fresh = True
-                if pub_date_str:
-                    try:
-                        pub_date = email.utils.parsedate_to_datetime(pub_date_str)
-                        if not is_within_3_days(pub_date):
-                            is_fresh = False
-                    except: pass
-                
-                if is_fresh:
-                    desc_html = item.find('description').text if item.find('description') is not None else ""
-                    desc_clean = re.sub(r'<[^>]+>', '', desc_html)
-                    clean_title = title.split(" - ")[0]
-                    
-                    if len(clean_title) > 4: 
-                        data.append({
-                            "title": clean_title, 
-                            "snippet": desc_clean[:200], 
-                            "source": source_name,
-                            "link": link
-                        })
-            
-            return data[:3]
-            
-        except: return []
-        finally: await browser.close()
-
-async def scrape_anue(stock_code):
-    try:
-        current_time = int(time.time())
-        url = f"https://ess.api.cnyes.com/ess/api/v1/news/keyword?q={stock_code}&limit=10&page=1"
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-            "Referer": "https://www.cnyes.com/"
-        }
-        response = requests.get(url, headers=headers, timeout=5)
-        
-        if response.status_code == 200:
-            data = response.json()
-            items = data.get('data', {}).get('items', [])
-            result = []
-            
-            three_days_ago_ts = current_time - (3 * 86400)
-            
-            for item in items:
-                publish_at = item.get('publishAt', 0)
-                if publish_at < three_days_ago_ts:
-                    continue
-                
-                title = item.get('title', '')
-                summary = item.get('summary')
-                if summary is None: summary = ""
-                
-                news_id = item.get('newsId')
-                link = f"https://news.cnyes.com/news/id/{news_id}" if news_id else None
-                
-                if title:
-                    result.append({
-                        "title": title,
-                        "snippet": summary,
-                        "source": "鉅亨網",
-                        "link": link
-                    })
-            
-            return result[:3]
-    except Exception:
-        pass
-    return []
-
-async def scrape_yahoo(stock_code):
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
-        context = await browser.new_context(user_agent=get_ua())
-        page = await context.new_page()
-        try:
-            await page.goto(f"https://tw.stock.yahoo.com/quote/{stock_code}.TW/news", timeout=20000, wait_until="domcontentloaded")
-            await page.wait_for_timeout(2000)
-            
-            data = []
-            elements = await page.locator('#main-2-QuoteNews-Proxy a[href*="/news/"]').all()
-            seen_titles = set()
-            
-            for el in elements[:3]: 
-                try:
-                    text = await el.inner_text()
-                    href = await el.get_attribute("href")
-                    
-                    lines = text.split('\n')
-                    title = max(lines, key=len) if lines else ""
-                    
-                    if len(title) > 5 and title not in seen_titles:
-                        seen_titles.add(title)
-                        data.append({
-                            "title": title, 
-                            "snippet": "Yahoo 焦點新聞 (最新)", 
-                            "source": "Yahoo",
-                            "link": href
-                        })
-                except: pass
-                
-            return data
-        except: return []
-        finally: await browser.close()
-
-async def scrape_udn(c): return await fetch_google_rss(c, "money.udn.com", "經濟日報")
-async def scrape_ltn(c): return await fetch_google_rss(c, "ec.ltn.com.tw", "自由財經")
-async def scrape_ctee(c): return await fetch_google_rss(c, "ctee.com.tw", "工商時報")
-async def scrape_chinatimes(c): return await fetch_google_rss(c, "chinatimes.com", "中時新聞")
-async def scrape_ettoday(c): return await fetch_google_rss(c, "ettoday.net", "ETtoday")
-async def scrape_tvbs(c): return await fetch_google_rss(c, "news.tvbs.com.tw", "TVBS新聞")
-async def scrape_businesstoday(c): return await fetch_google_rss(c, "businesstoday.com.tw", "今周刊")
-async def scrape_wealth(c): return await fetch_google_rss(c, "wealth.com.tw", "財訊")
-async def scrape_storm(c): return await fetch_google_rss(c, "storm.mg", "風傳媒")
-
-# ===========================
-# 3. AI 評分核心 (完全依賴 AI)
-# ===========================
-def get_available_model(api_key):
-    try:
-        url = f"https://generativelanguage.googleapis.com/v1beta/models?key={api_key}"
-        response = requests.get(url, timeout=5)
-        
-        if response.status_code == 200:
-            data = response.json()
-            models = data.get('models', [])
-            priority_list = ['models/gemini-1.5-flash', 'models/gemini-1.5-pro', 'models/gemini-1.0-pro', 'models/gemini-pro']
-            
-            for p_model in priority_list:
-                for m in models:
-                    if m['name'] == p_model and 'generateContent' in m['supportedGenerationMethods']:
-                        return m['name']
-            
-            for m in models:
-                if 'generateContent' in m['supportedGenerationMethods']:
-                    return m['name']
-    except Exception:
-        pass
-    return None
-
-def analyze_with_gemini_requests(api_key, stock_name, news_data):
-    model_name = get_available_model(api_key)
-    if not model_name: model_name = "models/gemini-pro"
-        
-    news_text = ""
-    for i, news in enumerate(news_data):
-        safe_snippet = news.get('snippet', '')
-        if safe_snippet is None: safe_snippet = ""
-        news_text += f"{i+1}. [{news['source']}] {news['title']}\n   摘要: {safe_snippet}\n"
-
-    # 🚀 AI 裁判提示詞 (強制要求 AI 打分)
-    prompt = f"""
-    你現在是一位權威的華爾街資深分析師。請仔細閱讀以下關於「{stock_name}」的最新新聞內容（包含標題與摘要）。
-
-    任務：
-    請不要依賴簡單的關鍵字，而是要「理解」新聞的語氣、具體數據（如營收、EPS、訂單量）以及市場預期，來給出一個綜合情緒分數。
-
-    新聞列表 (只包含最近 3 天的重點新聞)：
-    {news_text}
-
-    請輸出嚴格符合以下格式的報告 (請用繁體中文)：
-    1. **SCORE: [分數]** -> 請填入 0 到 100 的整數。
-       - 0-20: 極度恐慌 / 重大利空 (如跌停、虧損擴大、掉單)
-       - 40-60: 中立 / 觀望 / 多空交戰
-       - 80-100: 極度樂觀 / 重大利多 (如漲停、獲利創新高、接到大單)
-    2. **LEVEL**: (例如：偏多、觀望、主力出貨、利多出盡)。
-    3. **SUMMARY**: 請綜合分析這些新聞的核心影響。
-    4. **ANALYSIS**: 詳細列出你看多的理由與看空的理由。
-
-    範例輸出：
-    SCORE: 78
-    LEVEL: 樂觀偏多
-    SUMMARY: ...
-    ANALYSIS: ...
-    """
-
-    try:
-        url = f"https://generativelanguage.googleapis.com/v1beta/{model_name}:generateContent?key={api_key}"
-        headers = {'Content-Type': 'application/json'}
-        payload = {
-            "contents": [{"parts": [{"text": prompt}]}]
-        }
-        
-        response = requests.post(url, headers=headers, json=payload, timeout=60)
-        
-        if response.status_code == 200:
-            result = response.json()
-            if 'candidates' in result and len(result['candidates']) > 0:
-                content = result['candidates'][0]['content']['parts'][0]['text']
-                # 嚴格解析 AI 的分數
-                score_match = re.search(r"SCORE:\s*(\d+)", content, re.IGNORECASE)
-                score = int(score_match.group(1)) if score_match else None
-                return score, content, model_name
-        else:
-            return None, f"Error {response.status_code}: {response.text}", model_name
-
-    except Exception as e:
-        return None, str(e), model_name
-
-# 備用關鍵字算法 (只有在 AI 掛掉時才用)
-def calculate_score_keyword_fallback(news_list):
-    if not news_list: return 0
-    
-    positive = ["上漲", "飆", "創高", "買超", "強勢", "超預期", "取得", "超越", "利多", "成長", "收益", "噴", "漲停", "旺", "攻頂", "受惠", "看好", "翻紅", "驚艷", "AI", "擴產", "先進", "動能", "發威", "領先", "搶單", "季增", "年增", "樂觀", "回溫", "布局", "利潤", "大漲", "完勝", "收購", "賣廠", "百億"]
-    negative = ["下跌", "賣", "砍", "觀望", "保守", "不如", "重挫", "外資賣", "縮減", "崩", "跌停", "疲軟", "利空", "修正", "調節", "延後", "衰退", "翻黑", "示警", "重殺", "不如預期", "裁員", "虧損", "大跌", "重挫", "隱憂", "利空"]
-    
-    base_score = 50
-    for news in news_list:
-        snippet = news.get('snippet', '') or ""
-        content = news['title'] + " " + snippet
-        for w in positive: 
-            if w in content: base_score += 5
-        for w in negative: 
-            if w in content: base_score -= 5
-            
-    return max(0, min(100, base_score))
-
-async def run_analysis(stock_code):
-    return await asyncio.gather(
-        scrape_anue(stock_code), scrape_yahoo(stock_code), scrape_udn(stock_code),
-        scrape_ltn(stock_code), scrape_ctee(stock_code), scrape_chinatimes(stock_code),
-        scrape_ettoday(stock_code), scrape_tvbs(stock_code), scrape_businesstoday(stock_code),
-        scrape_wealth(stock_code), scrape_storm(stock_code)
-    )
-
 # ===========================
 # 4. Streamlit 介面 (V15.7)
 # ===========================
@@ -378,15 +36,16 @@ st.markdown("""<style>.source-tag { padding: 3px 6px; border-radius: 4px; font-s
 
 st.title("🛡️ V15.7 股市全視角熱度儀 (AI 裁判版)")
 
-# 自動同步
-if 'stock_dict' not in st.session_state:
-    with st.spinner("🚀 正在啟動天網：同步 2026 全市場股票清單..."):
-        stock_dict, count = asyncio.run(sync_market_data())
-        st.session_state.stock_dict = stock_dict
-        st.success(f"✅ 資料庫就緒：{count} 檔股票")
-        time.sleep(1) 
+# 股票索引：先用磁碟快照，市場清單過期時在背景同步，不擋畫面
+stock_index = get_stock_index()
+bootstrap.mark("index_ready")
+# 設了 ANALYSIS_SERVICE_URL 就當精簡前端：爬蟲、評分、預熱都在 service.py
+service = get_service_client()
+# 熱門股與最近查過的股票在背景預熱 (只用系統金鑰，不花使用者自己的額度)
+prefetcher = get_prefetcher(stock_index, SYSTEM_API_KEY) if service is None else None
 
 with st.sidebar:
+    view = st.radio("📺 畫面", ["個股分析", "全市場排行"], horizontal=True)
     st.header("⚙️ 設定")
     user_input = st.text_input("輸入股票 (如 2330 或 緯創)", value="2330")
     
@@ -399,11 +58,28 @@ with st.sidebar:
     else:
         user_key = st.text_input("Gemini API Key", type="password", placeholder="未檢測到系統 Key，請手動輸入")
         if user_key: active_key = user_key
+        elif service is not None:
+            # 服務端有沒有系統金鑰 (連不上時不記，下次重畫再問)
+            if 'service_ai' not in st.session_state:
+                try:
+                    st.session_state.service_ai = bool(run_sync(service.health()).get("ai"))
+                except SERVICE_ERRORS:
+                    pass
+            if st.session_state.get('service_ai'): st.caption("🛰️ 使用分析服務的系統金鑰")
+            else: st.caption("⚠️ 分析服務未設定金鑰，使用備用關鍵字算法")
         else: st.caption("⚠️ 使用備用關鍵字算法")
+    if active_key and service is None:  # 精簡模式的 AI 快取在服務端
+        memo_stats = get_score_memo().stats()
+        st.caption(f"🧮 AI 快取：命中 {memo_stats['hit']}、增量 {memo_stats['incremental']}、重算 {memo_stats['miss']} (命中率 {memo_stats['hit_rate']:.0%})")
     
     if user_input:
         if 'last_input' not in st.session_state or st.session_state.last_input != user_input:
-            code, name = asyncio.run(resolve_stock_info(user_input, st.session_state.stock_dict))
+            try:
+                code, name = run_sync(service.resolve(user_input) if service else resolve_stock_info(user_input, stock_index))
+            except SERVICE_ERRORS as e:
+                # 服務連不上時先用本機索引解析，分析時再提示
+                st.warning(f"分析服務無法使用，改用本機股票索引：{e}")
+                code, name = run_sync(resolve_stock_info(user_input, stock_index))
             if code:
                 st.session_state.target_code = code
                 st.session_state.target_name = name
@@ -413,84 +89,165 @@ with st.sidebar:
 
         if st.session_state.get('target_code'):
             st.markdown(f"<div class='stock-check'><div class='stock-name-text'>{st.session_state.target_name}</div><div>({st.session_state.target_code})</div></div>", unsafe_allow_html=True)
-        else: st.markdown(f"<div class='stock-check' style='color:#ff4757'>⚠️ 找不到目標</div>", unsafe_allow_html=True)
+        else:
+            st.markdown(f"<div class='stock-check' style='color:#ff4757'>⚠️ 找不到目標</div>", unsafe_allow_html=True)
+            suggestions = stock_index.suggest(user_input.strip().upper(), limit=3)
+            if suggestions:
+                st.caption("您是不是要找：" + "、".join(f"{name} ({code})" for code, name, _ in suggestions))
+    st.caption(f"📚 股票索引：{len(stock_index)} 檔")
     
     run_btn = st.button("🚀 啟動 AI 分析", type="primary", disabled=not st.session_state.get('target_code'))
 
+    bootstrap.mark("interactive")
+    bootstrap.record_startup(APP_VERSION)
+    with st.expander("⏱️ 啟動時間"):
+        for step, seconds in bootstrap.startup_timings().items():
+            st.caption(f"{step}: {seconds * 1000:.0f} ms")
+    if st.checkbox("🛠️ 來源監控 (偵錯)", value=False):
+        metrics = get_metrics()
+        rows = metrics.summary()
+        if rows:
+            st.dataframe(rows, hide_index=True)
+        else:
+            st.caption("尚無紀錄，分析一次後再來看")
+        if prefetcher is not None:
+            p = prefetcher.stats
+            st.caption(f"🔥 預熱：{p['rounds']} 輪 · {p['tickers']} 檔 · 重抓 {p['groups']} 組來源 · 預先評分 {p['scored']} 次")
+        else:
+            st.caption(f"🛰️ 分析服務：{ANALYSIS_SERVICE_URL} (來源監控請看服務的 /metrics)")
+        st.download_button("下載 Prometheus 格式", metrics.to_prometheus(), file_name="metrics.prom", mime="text/plain")
+        st.download_button("下載 JSON", metrics.to_json(), file_name="metrics.json", mime="application/json")
+
+def render_score(box, final_score, score_source, news_count):
+    with box.container():
+        # 顯示分數來源標籤
+        score_label = "🧠 AI 深度評分" if score_source == "AI" else "📊 備用關鍵字評分"
+        st.caption(score_label)
+        
+        st.metric("綜合評分", f"{final_score} 分", f"{news_count} 則精選新聞")
+        if final_score >= 75: l, c = "🔥🔥🔥 極度樂觀", "#ff4757"
+        elif final_score >= 60: l, c = "🔥 偏多看待", "#ffa502"
+        elif final_score <= 40: l, c = "🧊 偏空保守", "#5352ed"
+        else: l, c = "⚖️ 中立震盪", "#747d8c"
+        st.markdown(f"<h2 style='color:{c}'>{l}</h2>", unsafe_allow_html=True)
+
+def render_market_view():
+    # 全市場排行：只讀每日時間序列 (批次與個股分析寫入的分數)，不重新評分
+    st.subheader("📊 全市場情緒排行")
+    series = get_score_series()
+    days = series.recorded_days()
+    if not days:
+        st.info("還沒有任何評分紀錄：先跑一次 `python batch.py --top 1500`，或在個股分析查幾檔股票")
+        return
+    c1, c2 = st.columns([1, 2])
+    day = c1.selectbox("日期", days, format_func=lambda d: d.isoformat())
+    sort_key = c2.radio("排序", ["分數", "較前次", "z 分數", "新聞數"], horizontal=True)
+    cs = series.cross_section(day)
+    scored = ~np.isnan(cs["score"])
+    if not scored.any():
+        st.info("這一天沒有評分紀錄")
+        return
+    m1, m2, m3, m4 = st.columns(4)
+    m1.metric("已評分", f"{int(scored.sum())} 檔")
+    m2.metric("平均分數", f"{float(np.mean(cs['score'][scored])):.1f}")
+    m3.metric("偏多 (≥60)", f"{int((cs['score'][scored] >= 60).sum())} 檔")
+    m4.metric("偏空 (≤40)", f"{int((cs['score'][scored] <= 40).sum())} 檔")
+
+    key = {"分數": cs["score"], "較前次": cs["change"], "z 分數": cs["z"], "新聞數": cs["count"].astype(np.float32)}[sort_key]
+    order = [i for i in np.argsort(-np.where(np.isnan(key), -np.inf, key), kind="stable") if scored[i]]
+    as_float = lambda v: None if np.isnan(v) else round(float(v), 2)
+    rows = []
+    for i in order:
+        code = cs["codes"][i]
+        hit = stock_index.exact(code)
+        rows.append({
+            "排名": int(cs["rank"][i]), "代號": code, "名稱": hit[1] if hit else "",
+            "分數": float(cs["score"][i]), "較前次": as_float(cs["change"][i]), "新聞數": int(cs["count"][i]),
+            "來源": SOURCE_LABELS[int(cs["source"][i])], f"{ROLLING_WINDOW}日均": as_float(cs["avg"][i]), "z 分數": as_float(cs["z"][i]),
+        })
+    st.dataframe(rows, hide_index=True, height=600, column_config={
+        "分數": st.column_config.ProgressColumn("分數", min_value=0, max_value=100, format="%d"),
+    })
+
+def clean_ai_report(ai_report):
+    clean_report = ai_report.replace("SCORE:", "").strip()
+    # 移除 score 行以免重複顯示
+    return re.sub(r"SCORE: \d+\n?", "", clean_report)
+
+if view == "全市場排行":
+    render_market_view()
+    st.stop()
+
 if run_btn:
     target_code = st.session_state.get('target_code')
     target_name = st.session_state.get('target_name')
+    if prefetcher is not None: prefetcher.touch(target_code)
     
     status = st.empty(); bar = st.progress(0)
     status.text(f"🔍 爬蟲出動：正在為您篩選 {target_name} 最近 3 天的頭條新聞...")
-    bar.progress(10)
-    
-    results = asyncio.run(run_analysis(target_code))
-    bar.progress(60)
-    
-    all_news = []
-    source_names = ["鉅亨網", "Yahoo", "經濟日報", "自由財經", "工商時報", "中時新聞", "ETtoday", "TVBS新聞", "今周刊", "財訊", "風傳媒"]
-    data_map = {name: res for name, res in zip(source_names, results)}
-    for name, data in data_map.items():
-        all_news.extend(data)
-    
-    final_score = 0
-    ai_report = ""
-    score_source = "AI" # 標記分數來源
+    live_box = st.empty()
     
-    if active_key and all_news:
-        status.text("🧠 AI 正在閱讀內容並進行深度評分...")
-        bar.progress(80)
-        ai_score, ai_report, used_model = analyze_with_gemini_requests(active_key, target_name, all_news)
-        
-        if ai_score is not None:
-            final_score = ai_score
-            score_source = "AI" # 確認是 AI 打的分
-        else:
-            # AI 失敗時的備用方案
-            st.warning(f"AI 連線或解析失敗，轉為備用算法")
-            final_score = calculate_score_keyword_fallback(all_news)
-            score_source = "Fallback"
-            ai_report = "### AI 無法生成報告，僅提供新聞摘要"
-            
+    # 來源依完成順序陸續顯示；達到 quorum 或超過總預算就不再等慢的來源
+    data_map = {name: [] for name in SOURCE_NAMES}
+    source_status = {}
+    first_headline = None
+    if service is not None:
+        # 精簡模式：服務端收齊、去重後一次回傳 (同一檔股票的同時請求在服務端合併)
+        try:
+            payload = run_sync(service.news(target_code))
+        except Exception as e:
+            status.empty(); bar.empty()
+            st.error(f"分析服務無法使用：{e}")
+            st.stop()
+        for name, source in payload["sources"].items():
+            data_map[name] = source["items"]
+            source_status[name] = (source["status"], source["elapsed"])
+        first_headline = min((s["elapsed"] for s in payload["sources"].values() if s["items"]), default=None)
+        cache_ages = {name: source["age"] for name, source in payload["sources"].items()}
+        all_news = payload["news"]
     else:
-        status.text("⚡ 正在進行關鍵字計算...")
-        bar.progress(80)
-        final_score = calculate_score_keyword_fallback(all_news)
-        score_source = "Fallback"
-
-    bar.progress(100); time.sleep(0.5); status.empty(); bar.empty()
+        for name, items, state, elapsed in iterate_sync(stream_news(target_code)):
+            data_map[name] = items
+            source_status[name] = (state, elapsed)
+            if items and first_headline is None: first_headline = elapsed
+            bar.progress(len(source_status) / len(SOURCE_NAMES))
+            status.text(f"🔍 已收到 {len(source_status)}/{len(SOURCE_NAMES)} 個來源 ({elapsed:.1f}s)")
+            with live_box.container():
+                for n in [news for news_list in data_map.values() for news in news_list][:8]:
+                    st.caption(f"[{n['source']}] {n['title']}")
+        cache_ages = get_news_cache().ages(target_code, SOURCE_NAMES)
+
+        all_news = []
+        for name, data in data_map.items():
+            all_news.extend(data)
+        # 同一則通訊社稿件只留一則，來源記在 also_in
+        all_news = dedupe_news(all_news)
+    status.empty(); bar.empty(); live_box.empty()
 
+    # 精簡模式由服務端決定用系統金鑰或使用者的金鑰
+    use_ai = bool((active_key or (service is not None and st.session_state.get('service_ai'))) and all_news)
     col1, col2 = st.columns([1, 2])
     
     with col1:
-        # 顯示分數來源標籤
-        score_label = "🧠 AI 深度評分" if score_source == "AI" else "📊 備用關鍵字評分"
-        st.caption(score_label)
-        
-        st.metric("綜合評分", f"{final_score} 分", f"{len(all_news)} 則精選新聞")
-        if final_score >= 75: l, c = "🔥🔥🔥 極度樂觀", "#ff4757"
-        elif final_score >= 60: l, c = "🔥 偏多看待", "#ffa502"
-        elif final_score <= 40: l, c = "🧊 偏空保守", "#5352ed"
-        else: l, c = "⚖️ 中立震盪", "#747d8c"
-        st.markdown(f"<h2 style='color:{c}'>{l}</h2>", unsafe_allow_html=True)
+        score_box = st.empty()
+        if use_ai: score_box.info("🧠 AI 正在閱讀內容並進行深度評分...")
         
         st.divider()
         st.subheader("新聞來源分布")
         for name, data in data_map.items():
+            state = source_status.get(name, ("cancelled", None))[0]
             if data: 
-                st.caption(f"{name}: {len(data)} 則")
+                st.caption(f"{name}: {len(data)} 則 · {format_age(cache_ages.get(name))}")
+            elif state in ("timeout", "cancelled"):
+                st.caption(f"{name}: ⏳ 逾時略過")
+            elif state == "error":
+                st.caption(f"{name}: ⚠️ 暫時無法取得")
+        if first_headline is not None:
+            st.caption(f"⚡ 首則頭條 {first_headline * 1000:.0f} ms")
 
     with col2:
-        if active_key and "SCORE:" in ai_report:
-            st.subheader("🤖 AI 投資分析報告")
-            clean_report = ai_report.replace("SCORE:", "").strip()
-            # 移除 score 行以免重複顯示
-            clean_report = re.sub(r"SCORE: \d+\n?", "", clean_report)
-            st.info(clean_report)
-        else:
-            st.subheader("📊 分析結果")
-            st.write(ai_report)
+        report_title = st.empty()
+        report_box = st.empty()
             
         st.divider()
         st.subheader(f"📰 精選頭條 (近3日 Top 3)")
@@ -504,11 +261,67 @@ if run_btn:
                     link = f"https://www.google.com/search?q={n['title']}"
 
                 if len(snippet) > 50: snippet = snippet[:50] + "..."
+                also_in = f"<small style='color:#888'> (另見：{'、'.join(n['also_in'])})</small>" if n.get('also_in') else ""
                 
                 st.markdown(f"""
                 <div class='news-row'>
-                    <b>[{n['source']}]</b> <a href='{link}' target='_blank' style='text-decoration:none; font-weight:bold; color: #4DA6FF;'>{n['title']}</a><br>
+                    <b>[{n['source']}]</b> <a href='{link}' target='_blank' style='text-decoration:none; font-weight:bold; color: #4DA6FF;'>{n['title']}</a>{also_in}<br>
                     <small style='color:#aaa'>{snippet}</small>
                 </div>
                 """, unsafe_allow_html=True)
-        else: st.info("無新聞資料 (最近 3 天無重要新聞)")
\ No newline at end of file
+        else: st.info("無新聞資料 (最近 3 天無重要新聞)")
+
+        # 3 天前的舊聞：直接查本機封存，不連網
+        history = get_archive().search(stock_code=target_code, until=time.time() - 3 * 86400, limit=20)
+        if history:
+            with st.expander(f"📚 更早的新聞 (本機封存 {len(history)} 則)"):
+                for n in history:
+                    day = datetime.fromtimestamp(n['archived_at']).strftime("%Y-%m-%d")
+                    st.markdown(f"<small>{day}</small> <b>[{n['source']}]</b> <a href='{n['link'] or '#'}' target='_blank'>{n['title']}</a>", unsafe_allow_html=True)
+
+    # 頭條先顯示，AI 報告以串流方式逐段補上；分數一解析出來就先更新左欄
+    final_score = None
+    score_source = "Fallback"
+    ai_report = ""
+    ai_failed = use_ai
+    if use_ai and service is not None:
+        try:
+            result = run_sync(service.analyze(target_code, target_name, active_key if active_key != SYSTEM_API_KEY else None))
+            if result["score_source"] == "AI":
+                final_score, score_source, ai_report = result["score"], "AI", result["report"]
+                render_score(score_box, final_score, "AI", len(all_news))
+                report_title.subheader("🤖 AI 投資分析報告")
+                report_box.info(clean_ai_report(ai_report))
+            else:
+                # 服務端的備用算法分數直接用；服務端沒有金鑰時不算 AI 失敗
+                final_score, ai_failed = result["score"], result.get("ai", True)
+                render_score(score_box, final_score, "Fallback", len(all_news))
+        except Exception:
+            pass
+    elif use_ai:
+        report_title.subheader("🤖 AI 投資分析報告")
+        try:
+            for ai_report, ai_score, used_model in iterate_sync(stream_with_gemini(active_key, target_name, all_news, target_code)):
+                if ai_score is not None and final_score is None:
+                    final_score = ai_score
+                    score_source = "AI"
+                    render_score(score_box, final_score, "AI", len(all_news))
+                report_box.info(clean_ai_report(ai_report))
+        except Exception:
+            pass
+
+    if final_score is None:
+        final_score = calculate_score_keyword_fallback(all_news)
+        render_score(score_box, final_score, "Fallback", len(all_news))
+    if score_source == "Fallback":
+        report_title.subheader("📊 分析結果")
+        if ai_failed:
+            # AI 失敗時的備用方案
+            st.warning(f"AI 連線或解析失敗，轉為備用算法")
+            report_box.write("### AI 無法生成報告，僅提供新聞摘要")
+        else:
+            report_box.write(ai_report)
+
+    # 記進每日時間序列 (全市場排行用)；精簡模式由服務端記錄
+    if all_news and service is None:
+        get_score_series().record(target_code, final_score, score_source, len(all_news))
@@ -0,0 +1,179 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+from news_cache import CACHE_DIR
+
+# ===========================
+# 📚 新聞封存 (只增不刪，含全文索引)
+# ===========================
+# 爬蟲解析到的每一則新聞 (包含被 3 天新鮮度過濾掉的舊聞) 都寫進來，以 GUID / 連結去重。
+# 同一則新聞可能出現在多檔股票的查詢結果，股票對應另存一張表。
+# 全文索引用 SQLite FTS5：中文沒有空白斷詞，寫入時把中文切成重疊的兩字詞 (bigram)，
+# 查詢時再把關鍵字切成同樣的詞組做片語比對，「營收」「台積電」這種短詞也走索引。
+ARCHIVE_PATH = os.environ.get("NEWS_ARCHIVE_PATH", os.path.join(CACHE_DIR, "news_archive.sqlite3"))
+ARCHIVE_ENABLED = os.environ.get("NEWS_ARCHIVE", "1") != "0"
+ARCHIVE_DEFAULT_LIMIT = 50
+
+_CJK = r"㐀-䶿一-鿿豈-﫿"
+_TERM_RE = re.compile(rf"[{_CJK}]+|[0-9a-z]+")
+
+
+def _norm(text):
+    return unicodedata.normalize("NFKC", text or "").lower()
+
+
+def fts_terms(text):
+    # "台積電營收 AI" -> "台積 積電 電營 營收 收 ai"：每段中文最後一個字單獨再放一次，單字查詢才找得到
+    out = []
+    for run in _TERM_RE.findall(_norm(text)):
+        if run[0] <= "z":
+            out.append(run)
+            continue
+        out.extend(run[i:i + 2] for i in range(len(run) - 1))
+        out.append(run[-1])
+    return " ".join(out)
+
+
+def fts_query(text):
+    # 使用者輸入 -> FTS5 查詢；空白分開的關鍵字都要出現 (AND)
+    parts = []
+    for run in _TERM_RE.findall(_norm(text)):
+        if run[0] <= "z" or len(run) == 1:
+            parts.append(f"{run}*")  # 英數字首比對；單一中文字 = 以它開頭的兩字詞或段尾單字
+        else:
+            parts.append('"' + " ".join(run[i:i + 2] for i in range(len(run) - 1)) + '"')
+    return " ".join(parts)
+
+
+def article_uid(record):
+    # 去重用：GUID > 連結 > 來源 + 標題
+    if record.get("guid"): return record["guid"]
+    if record.get("link"): return record["link"]
+    raw = f"{record.get('source')}\x1f{_norm(record.get('title'))}"
+    return "sha1:" + hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class NewsArchive:
+    def __init__(self, path=ARCHIVE_PATH):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS articles ("
+            " id INTEGER PRIMARY KEY, uid TEXT NOT NULL UNIQUE, source TEXT NOT NULL,"
+            " title TEXT NOT NULL, snippet TEXT NOT NULL, link TEXT,"
+            " published_at REAL NOT NULL, dated INTEGER NOT NULL, first_seen REAL NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS idx_articles_published ON articles (published_at);"
+            "CREATE INDEX IF NOT EXISTS idx_articles_source ON articles (source, published_at);"
+            "CREATE TABLE IF NOT EXISTS article_stocks ("
+            " stock_code TEXT NOT NULL, article_id INTEGER NOT NULL, published_at REAL NOT NULL,"
+            " PRIMARY KEY (stock_code, article_id)) WITHOUT ROWID;"
+            "CREATE INDEX IF NOT EXISTS idx_article_stocks_time ON article_stocks (stock_code, published_at);"
+            # contentless：原文已在 articles，索引只需要 rowid
+            "CREATE VIRTUAL TABLE IF NOT EXISTS articles_fts USING fts5(terms, content='', tokenize='unicode61');"
+        )
+        self._conn.commit()
+
+    def add(self, stock_code, records, seen_at=None):
+        # records：[{title, snippet, source, link, guid?, published_at (timestamp 或 None)}]
+        # 回傳新增的則數；已封存過的只補上股票對應
+        seen_at = time.time() if seen_at is None else seen_at
+        by_uid = {}
+        for r in records:
+            if r.get("title"): by_uid.setdefault(article_uid(r), r)
+        if not by_uid: return 0
+        uids = list(by_uid)
+        added = 0
+        with self._lock:
+            known = {}
+            for i in range(0, len(uids), 500):
+                chunk = uids[i:i + 500]
+                for uid, article_id, published_at in self._conn.execute(
+                    f"SELECT uid, id, published_at FROM articles WHERE uid IN ({','.join('?' * len(chunk))})", chunk,
+                ):
+                    known[uid] = (article_id, published_at)
+            links = []
+            for uid, r in by_uid.items():
+                if uid in known:
+                    article_id, published_at = known[uid]
+                else:
+                    dated = r.get("published_at") is not None
+                    published_at = r["published_at"] if dated else seen_at
+                    snippet = r.get("snippet") or ""
+                    cur = self._conn.execute(
+                        "INSERT INTO articles (uid, source, title, snippet, link, published_at, dated, first_seen)"
+                        " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (uid, r.get("source") or "", r["title"], snippet, r.get("link"), published_at, int(dated), seen_at),
+                    )
+                    article_id = cur.lastrowid
+                    self._conn.execute("INSERT INTO articles_fts (rowid, terms) VALUES (?, ?)", (article_id, fts_terms(r["title"] + " " + snippet)))
+                    added += 1
+                links.append((stock_code, article_id, published_at))
+            if stock_code:
+                self._conn.executemany("INSERT OR IGNORE INTO article_stocks VALUES (?, ?, ?)", links)
+            self._conn.commit()
+        return added
+
+    def search(self, text=None, stock_code=None, source=None, since=None, until=None, limit=ARCHIVE_DEFAULT_LIMIT):
+        # 依股票 / 來源 / 時間區間 / 關鍵字查詢，新的在前；時間為 Unix timestamp
+        if stock_code:
+            sql = ("SELECT a.title, a.snippet, a.source, a.link, s.published_at, a.dated"
+                   " FROM article_stocks s JOIN articles a ON a.id = s.article_id WHERE s.stock_code = ?")
+            args, time_col = [stock_code], "s.published_at"
+        else:
+            sql = "SELECT a.title, a.snippet, a.source, a.link, a.published_at, a.dated FROM articles a WHERE 1"
+            args, time_col = [], "a.published_at"
+        if source:
+            sql += " AND a.source = ?"; args.append(source)
+        if since is not None:
+            sql += f" AND {time_col} >= ?"; args.append(since)
+        if until is not None:
+            sql += f" AND {time_col} < ?"; args.append(until)
+        if text:
+            query = fts_query(text)
+            if not query: return []
+            sql += " AND a.id IN (SELECT rowid FROM articles_fts WHERE articles_fts MATCH ?)"; args.append(query)
+        sql += f" ORDER BY {time_col} DESC LIMIT ?"; args.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, args).fetchall()
+        return [
+            {"title": t, "snippet": s, "source": src, "link": link, "published_at": p if dated else None, "archived_at": p}
+            for t, s, src, link, p, dated in rows
+        ]
+
+    def stats(self):
+        with self._lock:
+            articles = self._conn.execute("SELECT COUNT(*) FROM articles").fetchone()[0]
+            stocks = self._conn.execute("SELECT COUNT(DISTINCT stock_code) FROM article_stocks").fetchone()[0]
+            oldest = self._conn.execute("SELECT MIN(published_at) FROM articles").fetchone()[0]
+        return {"articles": articles, "stocks": stocks, "oldest": oldest}
+
+
+def archive_news(stock_code, records):
+    # 爬蟲呼叫用：封存失敗 (磁碟滿、鎖住) 不影響抓新聞
+    if not ARCHIVE_ENABLED or not records: return 0
+    try:
+        return get_archive().add(stock_code, records)
+    except sqlite3.Error:
+        return 0
+
+
+_archive = None
+_archive_lock = threading.Lock()
+
+
+def get_archive():
+    global _archive
+    with _archive_lock:
+        if _archive is None:
+            _archive = NewsArchive()
+    return _archive
@@ -0,0 +1,128 @@
+import asyncio
+import atexit
+import queue
+import sys
+import threading
+
+if sys.platform.startswith("win"):
+    asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
+
+# ===========================
+# 🔁 常駐事件迴圈 (跨 Streamlit rerun 共用)
+# ===========================
+# Playwright 瀏覽器、HTTP 連線池這類長壽資源都綁在建立它們的 event loop 上，
+# 而 asyncio.run() 每次 rerun 都會開一個新 loop 再關掉，資源根本留不住。
+# 這裡開一條 daemon thread 跑「全程序唯一」的 loop，所有非同步工作都丟進來跑。
+# app.py 每次 rerun 都會重跑，但 import 進來的模組不會，所以狀態能活過 rerun。
+
+_loop = None
+_thread = None
+_lock = threading.Lock()
+_shutdown_hooks = []
+
+
+def get_loop():
+    global _loop, _thread
+    with _lock:
+        if _loop is None or _loop.is_closed():
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+
+            def _run():
+                asyncio.set_event_loop(loop)
+                ready.set()
+                loop.run_forever()
+
+            thread = threading.Thread(target=_run, name="async-runtime", daemon=True)
+            thread.start()
+            ready.wait()
+            _loop, _thread = loop, thread
+    return _loop
+
+
+def in_runtime():
+    try:
+        return asyncio.get_running_loop() is _loop
+    except RuntimeError:
+        return False
+
+
+def run_sync(coro, timeout=None):
+    # 同步程式 (Streamlit script) 的入口，取代 asyncio.run()
+    if in_runtime():
+        raise RuntimeError("run_sync() 不能在 runtime loop 內呼叫，請直接 await")
+    future = asyncio.run_coroutine_threadsafe(coro, get_loop())
+    return future.result(timeout)
+
+
+def submit(coro):
+    # 丟到背景執行不等結果，回傳 concurrent.futures.Future
+    return asyncio.run_coroutine_threadsafe(coro, get_loop())
+
+
+async def on_runtime(coro):
+    # 在任意 loop 中 await，確保 coro 實際跑在 runtime loop 上
+    if in_runtime():
+        return await coro
+    return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, get_loop()))
+
+
+def add_shutdown_hook(hook):
+    # hook 為無參數的 async function，關閉時依註冊的反序執行
+    if hook not in _shutdown_hooks:
+        _shutdown_hooks.append(hook)
+
+
+def shutdown(timeout=10):
+    global _loop, _thread
+    with _lock:
+        loop, thread = _loop, _thread
+        _loop, _thread = None, None
+    if loop is None or loop.is_closed():
+        return
+
+    async def _run_hooks():
+        for hook in reversed(_shutdown_hooks):
+            try:
+                await hook()
+            except Exception:
+                pass
+
+    try:
+        asyncio.run_coroutine_threadsafe(_run_hooks(), loop).result(timeout)
+    except Exception:
+        pass
+    loop.call_soon_threadsafe(loop.stop)
+    if thread is not None:
+        thread.join(timeout)
+    if not loop.is_running():
+        loop.close()
+
+
+atexit.register(shutdown)
+
+
+def iterate_sync(agen, timeout=None):
+    # 在 runtime loop 上跑 async generator，讓同步程式 (Streamlit) 用 for 迴圈逐一取值
+    items = queue.Queue()
+    done = object()
+
+    async def _pump():
+        try:
+            async for item in agen:
+                items.put((True, item))
+            items.put((done, None))
+        except BaseException as e:
+            items.put((False, e))
+
+    future = submit(_pump())
+    try:
+        while True:
+            ok, item = items.get(timeout=timeout)
+            if ok is done:
+                return
+            if ok is False:
+                raise item
+            yield item
+    finally:
+        future.cancel()
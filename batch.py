@@ -0,0 +1,266 @@
+import argparse
+import asyncio
+import csv
+import json
+import os
+import random
+import sys
+import math
+import time
+from contextlib import aclosing
+from datetime import datetime
+
+from async_runtime import run_sync
+from dedup import dedupe_news
+from metrics import get_metrics
+from rate_limit import get_rate_limiter
+from scoring import score_news
+from scrapers import GATHER_QUORUM, SOURCE_NAMES, stream_news
+from stock_index import StockIndex, resolve_stock_info
+from timeseries import get_score_series
+
+# ===========================
+# 📦 批次 / 自選股模式 (不經過 Streamlit)
+# ===========================
+# 用法：
+#   python batch.py --top 1500 --out morning.jsonl
+#   python batch.py --watchlist watchlist.txt --out watch.csv --concurrency 16
+#   python batch.py --watchlist watchlist.txt --rate news.google.com=1/2 --no-ai
+# 輸出檔同時就是進度檔：重跑時會跳過已成功寫入的股票 (加 --restart 從頭來)。
+GEMINI_HOST = "generativelanguage.googleapis.com"
+DEFAULT_RATES = {
+    "news.google.com": (2.0, 4),
+    "ess.api.cnyes.com": (5.0, 5),
+    "tw.stock.yahoo.com": (1.0, 2),
+    "scanner.tradingview.com": (1.0, 1),
+    GEMINI_HOST: (0.25, 1),
+}
+CSV_FIELDS = ["code", "name", "score", "score_source", "model", "news_count", "sources", "analyzed_at", "elapsed", "attempts", "error"]
+
+
+def parse_rate(spec):
+    # "news.google.com=2/4" -> ("news.google.com", 2.0, 4)；rate 為 0 代表不限流
+    domain, _, value = spec.partition("=")
+    rate, _, burst = value.partition("/")
+    return domain.strip(), float(rate), int(burst) if burst else 1
+
+
+def read_watchlist(path):
+    entries = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.split("#", 1)[0]
+            entries.extend(part.strip() for part in line.replace(",", " ").split() if part.strip())
+    return entries
+
+
+async def build_universe(args):
+    index = StockIndex.load()
+    if index.is_stale() or len(index.ranking) < (args.top or 0):
+        await index.refresh()
+    if args.top:
+        return index.ranking[:args.top]
+    universe, seen = [], set()
+    for entry in read_watchlist(args.watchlist):
+        code, name = await resolve_stock_info(entry, index)
+        if not code:
+            print(f"⚠️ 找不到股票：{entry}", file=sys.stderr)
+            continue
+        if code not in seen:
+            seen.add(code)
+            universe.append((code, name))
+    return universe
+
+
+def load_done(path):
+    # 已成功的股票代號 (error 為空)
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8", newline="") as f:
+        if path.endswith(".csv"):
+            rows = csv.DictReader(f)
+        else:
+            rows = (json.loads(line) for line in f if line.strip())
+        for row in rows:
+            if not row.get("error"):
+                done.add(row["code"])
+    return done
+
+
+class ResultWriter:
+    def __init__(self, path, restart=False):
+        self.path = path
+        self.is_csv = path.endswith(".csv")
+        exists = os.path.exists(path) and not restart
+        self._f = open(path, "a" if exists else "w", encoding="utf-8", newline="")
+        if self.is_csv:
+            self._csv = csv.DictWriter(self._f, fieldnames=CSV_FIELDS, extrasaction="ignore")
+            if not exists or os.path.getsize(path) == 0:
+                self._csv.writeheader()
+
+    def write(self, record):
+        if self.is_csv:
+            self._csv.writerow({**record, "sources": json.dumps(record["sources"], ensure_ascii=False)})
+        else:
+            self._f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._f.flush()
+
+    def close(self):
+        self._f.close()
+
+
+class SourcesUnavailable(Exception):
+    # 太多來源被擋 / 逾時：不當成「這檔沒新聞」寫進結果，交給 with_retry 退避重試
+    pass
+
+
+async def analyze_ticker(code, name, api_key, with_report=False, quorum=GATHER_QUORUM):
+    # 等所有來源 (仍受總預算與各來源逾時限制)；成功的來源不到 quorum 比例就丟 SourcesUnavailable
+    data_map, failed = {}, {}
+    async with aclosing(stream_news(code, quorum=1.0)) as stream:
+        async for source, items, state, _ in stream:
+            data_map[source] = items
+            if state != "ok":
+                failed[source] = state
+    if len(SOURCE_NAMES) - len(failed) < math.ceil(len(SOURCE_NAMES) * quorum):
+        raise SourcesUnavailable(", ".join(f"{source} {state}" for source, state in failed.items()))
+    results = [data_map.get(source, []) for source in SOURCE_NAMES]
+    all_news = dedupe_news([news for res in results for news in res])
+    if api_key and all_news:
+        await get_rate_limiter().acquire(GEMINI_HOST)
+    score, report, score_source, model = await score_news(api_key, name, all_news, raise_transient=True, stock_code=code)
+    record = {
+        "code": code,
+        "name": name,
+        "score": score,
+        "score_source": score_source,
+        "model": model,
+        "news_count": len(all_news),
+        "sources": {source: len(res) for source, res in zip(SOURCE_NAMES, results) if res},
+    }
+    if with_report:
+        record["report"] = report
+    return record
+
+
+async def with_retry(fn, retries, backoff):
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            return await fn(), attempt
+        except Exception:
+            if attempt > retries:
+                raise
+            # 指數退避 + 抖動，避免所有 worker 同時重打
+            await asyncio.sleep(backoff * (2 ** (attempt - 1)) + random.uniform(0, backoff))
+
+
+class Progress:
+    def __init__(self, total, every):
+        self.total = total
+        self.every = every
+        self.done = 0
+        self.failed = 0
+        self.started = time.perf_counter()
+
+    def per_minute(self):
+        elapsed = time.perf_counter() - self.started
+        return self.done / elapsed * 60 if elapsed > 0 else 0.0
+
+    def tick(self, failed=False):
+        self.done += 1
+        self.failed += int(failed)
+        if self.done % self.every == 0 or self.done == self.total:
+            rate = self.per_minute()
+            eta = (self.total - self.done) / rate if rate else 0
+            print(f"[{self.done}/{self.total}] {rate:.1f} 檔/分鐘，失敗 {self.failed}，預估剩餘 {eta:.1f} 分鐘", file=sys.stderr)
+
+
+async def run_batch(args):
+    limiter = get_rate_limiter()
+    for domain, (rate, burst) in DEFAULT_RATES.items():
+        limiter.configure(domain, rate, burst)
+    for spec in args.rate:
+        limiter.configure(*parse_rate(spec))
+
+    universe = await build_universe(args)
+    done = set() if args.restart else load_done(args.out)
+    pending = [(code, name) for code, name in universe if code not in done]
+    print(f"共 {len(universe)} 檔，已完成 {len(universe) - len(pending)} 檔，本次處理 {len(pending)} 檔", file=sys.stderr)
+
+    writer = ResultWriter(args.out, restart=args.restart)
+    series = get_score_series()
+    progress = Progress(len(pending), args.progress_every)
+    queue = asyncio.Queue()
+    for item in pending:
+        queue.put_nowait(item)
+
+    async def worker():
+        while True:
+            try:
+                code, name = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            started = time.perf_counter()
+            try:
+                record, attempts = await with_retry(lambda: analyze_ticker(code, name, args.api_key, args.with_report, args.quorum), args.retries, args.backoff)
+                record["error"] = ""
+                # 記進每日時間序列，全市場排行直接讀這裡 (沒有新聞的不算分)
+                if record["news_count"]:
+                    series.record(code, record["score"], record["score_source"], record["news_count"])
+            except Exception as e:
+                record, attempts = {"code": code, "name": name, "score": None, "score_source": None, "model": None, "news_count": 0, "sources": {}}, args.retries + 1
+                record["error"] = f"{type(e).__name__}: {e}"
+            record["analyzed_at"] = datetime.now().isoformat(timespec="seconds")
+            record["elapsed"] = round(time.perf_counter() - started, 3)
+            record["attempts"] = attempts
+            writer.write(record)
+            progress.tick(failed=bool(record["error"]))
+
+    try:
+        await asyncio.gather(*[worker() for _ in range(max(1, args.concurrency))])
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - progress.started
+    print(f"✅ 完成 {progress.done} 檔 (失敗 {progress.failed})，耗時 {elapsed:.1f} 秒，吞吐量 {progress.per_minute():.1f} 檔/分鐘", file=sys.stderr)
+    for domain, waited in sorted(limiter.waited.items()):
+        print(f"   限流等待 {domain}: {waited:.1f} 秒", file=sys.stderr)
+    if args.metrics:
+        get_metrics().save(args.metrics)
+        print(f"   來源監控數據已寫入 {args.metrics}", file=sys.stderr)
+    return progress
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="台股新聞情緒批次分析")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--watchlist", help="自選股清單檔 (每行一檔，代號或名稱皆可，# 之後為註解)")
+    target.add_argument("--top", type=int, help="依 TradingView 成交量取前 N 檔")
+    parser.add_argument("--out", default="batch_results.jsonl", help="輸出檔 (.jsonl 或 .csv)，同時作為續跑進度")
+    parser.add_argument("--concurrency", type=int, default=8, help="同時分析的股票數")
+    parser.add_argument("--rate", action="append", default=[], metavar="DOMAIN=R[/BURST]", help="覆寫網域限流 (每秒請求數)，可重複指定")
+    parser.add_argument("--retries", type=int, default=2)
+    parser.add_argument("--backoff", type=float, default=2.0, help="重試退避基準秒數")
+    parser.add_argument("--quorum", type=float, default=GATHER_QUORUM, help="至少要有這個比例的來源成功，否則退避重試 (重試完仍不足記為失敗，續跑時會再處理)")
+    parser.add_argument("--api-key", default=os.environ.get("GEMINI_API_KEY"), help="Gemini API Key (預設讀 GEMINI_API_KEY)")
+    parser.add_argument("--no-ai", action="store_true", help="只用備用關鍵字算法")
+    parser.add_argument("--with-report", action="store_true", help="JSONL 輸出附上 AI 報告全文")
+    parser.add_argument("--restart", action="store_true", help="忽略既有輸出，從頭開始")
+    parser.add_argument("--progress-every", type=int, default=10)
+    parser.add_argument("--metrics", metavar="PATH", help="結束時輸出各來源耗時 / 失敗統計 (.json 或 Prometheus 文字格式)")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.no_ai:
+        args.api_key = None
+    progress = run_sync(run_batch(args))
+    return 1 if progress.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
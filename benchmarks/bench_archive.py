@@ -0,0 +1,82 @@
+"""新聞封存的微基準：灌入整個市場一年份的假新聞，量寫入速度與各種查詢的延遲。
+
+    python benchmarks/bench_archive.py --stocks 1500 --days 365 --per-day 1
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from archive import NewsArchive  # noqa: E402
+
+FILLER = "台積電鴻海聯發科營收法人表示市場公司股價今年訂單客戶產能供應鏈半導體需求預估第季月日的了在與及將"
+SOURCES = ["鉅亨網", "Yahoo", "經濟日報", "自由財經", "工商時報", "中時新聞", "ETtoday", "TVBS新聞", "今周刊", "財訊", "風傳媒"]
+QUERIES = [
+    ("單檔 + 近 30 天", dict(stock_code="2330", days=30)),
+    ("單檔 + 一整年", dict(stock_code="2330", days=365)),
+    ("來源 + 近 7 天", dict(source="經濟日報", days=7)),
+    ("關鍵字 (常見)", dict(text="營收")),
+    ("關鍵字 (少見)", dict(text="量子電腦")),
+    ("關鍵字 + 單檔 + 近 90 天", dict(text="法人", stock_code="2330", days=90)),
+]
+
+
+def make_records(rng, day_ts, n, uid_base):
+    out = []
+    for i in range(n):
+        title = "".join(rng.choice(FILLER) for _ in range(22))
+        if rng.random() < 0.001: title = "量子電腦" + title
+        out.append({
+            "title": title, "snippet": "".join(rng.choice(FILLER) for _ in range(80)),
+            "source": rng.choice(SOURCES), "link": f"https://example.com/{uid_base + i}",
+            "published_at": day_ts + rng.uniform(0, 86400),
+        })
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--stocks", type=int, default=1500)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--per-day", type=int, default=1, help="每檔每天的新聞數")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    codes = ["2330"] + [str(1101 + i) for i in range(args.stocks - 1)]
+    now = time.time()
+    with tempfile.TemporaryDirectory() as tmp:
+        archive = NewsArchive(os.path.join(tmp, "archive.sqlite3"))
+        t0 = time.perf_counter()
+        uid = 0
+        # 一次寫入 10 天份，約等於一次爬蟲呼叫拿回的則數 (鉅亨網 limit=10)
+        for start in range(0, args.days, 10):
+            for code in codes:
+                records = []
+                for d in range(start, min(start + 10, args.days)):
+                    records += make_records(rng, now - (d + 1) * 86400, args.per_day, uid + len(records))
+                archive.add(code, records)
+                uid += len(records)
+        elapsed = time.perf_counter() - t0
+        size = os.path.getsize(os.path.join(tmp, "archive.sqlite3")) / 1024 / 1024
+        print(f"寫入 {uid} 則：{elapsed:.1f}s ({uid / elapsed:,.0f} 則/秒)，檔案 {size:.0f} MB")
+
+        for label, spec in QUERIES:
+            spec = dict(spec)
+            days = spec.pop("days", None)
+            since = now - days * 86400 if days else None
+            times = []
+            for _ in range(args.repeat):
+                t0 = time.perf_counter()
+                rows = archive.search(since=since, limit=50, **spec)
+                times.append((time.perf_counter() - t0) * 1000)
+            times.sort()
+            print(f"  {label:<24} {len(rows):>3} 則  p50 {times[len(times) // 2]:7.2f} ms  max {times[-1]:7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
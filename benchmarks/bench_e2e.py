@@ -0,0 +1,203 @@
+"""端到端離線效能測試：run_analysis 延遲、批次吞吐量、峰值記憶體，並與基準值比較。
+
+    python benchmarks/bench_e2e.py                      # 跑一次，退步超過容許範圍就回傳 1
+    python benchmarks/bench_e2e.py --update-baseline    # 把這次結果寫成新的基準
+    python benchmarks/bench_e2e.py --error rss=0.2      # 帶錯誤注入跑 (不和基準比較)
+
+所有外部來源都由 fixture_server.py 在本機子程序扮演，快取、索引、評分備忘錄
+都寫到暫存目錄，不會動到 .cache/。基準值存在 benchmarks/baselines.json，
+換機器或調整 fixture 延遲後請重新 --update-baseline。
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, HERE)
+
+from fixture_server import endpoint_env  # noqa: E402
+
+BASELINE_PATH = os.path.join(HERE, "baselines.json")
+# 指標 -> 越大越好 (True) 或越小越好 (False)
+METRICS = {
+    "run_analysis_p50_ms": False,
+    "run_analysis_p95_ms": False,
+    "batch_tickers_per_min": True,
+    "peak_rss_mb": False,
+}
+ABSOLUTE_SLACK = {"run_analysis_p50_ms": 50.0, "run_analysis_p95_ms": 100.0, "batch_tickers_per_min": 5.0, "peak_rss_mb": 20.0}
+
+
+def percentile(values, q):
+    values = sorted(values)
+    if not values: return 0.0
+    k = (len(values) - 1) * q
+    lo, hi = int(k), min(int(k) + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def start_fixture_server(args):
+    cmd = [sys.executable, os.path.join(HERE, "fixture_server.py"), "--port", "0", "--seed", str(args.seed)]
+    if args.no_latency: cmd.append("--no-latency")
+    for spec in args.latency: cmd += ["--latency", spec]
+    for spec in args.error: cmd += ["--error", spec]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True)
+    line = proc.stdout.readline()
+    try:
+        return proc, json.loads(line)["base_url"]
+    except (ValueError, KeyError):
+        proc.kill()
+        raise SystemExit(f"fixture server 啟動失敗：{line!r}")
+
+
+def prepare_env(base_url, workdir):
+    os.environ.update(endpoint_env(base_url))
+    os.environ["NEWS_CACHE_DIR"] = workdir
+    # 沿用既有的 Chromium 安裝紀錄，避免每次都重跑 playwright install
+    marker = os.path.join(ROOT, ".cache", "bootstrap.json")
+    if os.path.exists(marker):
+        shutil.copy(marker, os.path.join(workdir, "bootstrap.json"))
+
+
+def bench_run_analysis(codes, iterations):
+    # 回傳 (延遲, 平均則數, {來源: 沒拿到新聞的次數})；fixtures 每個來源都有新聞，空的就是壞了
+    from async_runtime import run_sync
+    from scrapers import SOURCE_NAMES, run_analysis
+
+    run_sync(run_analysis(codes[0], use_cache=False))  # 暖身：連線池、瀏覽器
+    latencies, items, empty = [], 0, {}
+    for i in range(iterations):
+        t0 = time.perf_counter()
+        results = run_sync(run_analysis(codes[i % len(codes)], use_cache=False))
+        latencies.append((time.perf_counter() - t0) * 1000)
+        items += sum(len(r) for r in results)
+        for name, res in zip(SOURCE_NAMES, results):
+            if not res: empty[name] = empty.get(name, 0) + 1
+    return latencies, items / max(iterations, 1), empty
+
+
+def bench_batch(workdir, top, concurrency):
+    import batch
+    from async_runtime import run_sync
+
+    out = os.path.join(workdir, "batch.jsonl")
+    args = batch.build_parser().parse_args([
+        "--top", str(top), "--out", out, "--concurrency", str(concurrency),
+        "--api-key", "bench-key", "--restart", "--progress-every", str(10 ** 6),
+        "--rate", f"{batch.GEMINI_HOST}=0",  # 量程式本身的吞吐量，不是 Gemini 的配額
+    ])
+    t0 = time.perf_counter()
+    progress = run_sync(batch.run_batch(args))
+    elapsed = time.perf_counter() - t0
+    return progress.done / elapsed * 60 if elapsed else 0.0, progress.failed
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, higher_is_better in METRICS.items():
+        if name not in baseline: continue
+        base, now = baseline[name], results[name]
+        slack = max(abs(base) * tolerance, ABSOLUTE_SLACK[name])
+        worse = now < base - slack if higher_is_better else now > base + slack
+        mark = "❌" if worse else "✅"
+        print(f"  {mark} {name:<24} {now:>10.1f}  (基準 {base:.1f}，容許 ±{slack:.1f})")
+        if worse: regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20, help="run_analysis 量測次數")
+    parser.add_argument("--batch-top", type=int, default=30, help="批次模式處理的檔數")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", action="append", default=[], metavar="KIND=MEAN[:JITTER]", help="傳給 fixture_server")
+    parser.add_argument("--error", action="append", default=[], metavar="KIND=RATE[:STATUS]", help="傳給 fixture_server")
+    parser.add_argument("--no-latency", action="store_true", help="替身伺服器不加延遲")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--tolerance", type=float, default=0.25, help="相對基準可容許的退步比例")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--json", metavar="PATH", help="另外把結果寫成 JSON")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="tsnews-bench-")
+    proc, base_url = start_fixture_server(args)
+    try:
+        prepare_env(base_url, workdir)
+        from async_runtime import shutdown
+        from metrics import get_metrics
+        from stock_index import BASE_STOCKS
+
+        codes = list(BASE_STOCKS.values())[:10]
+        latencies, avg_items, empty = bench_run_analysis(codes, args.iterations)
+        per_min, failed = bench_batch(workdir, args.batch_top, args.concurrency)
+        results = {
+            "run_analysis_p50_ms": round(percentile(latencies, 0.5), 1),
+            "run_analysis_p95_ms": round(percentile(latencies, 0.95), 1),
+            "batch_tickers_per_min": round(per_min, 1),
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+        }
+        slowest = sorted(get_metrics().summary(), key=lambda r: -r["p95_s"])[:5]
+        shutdown()
+    finally:
+        proc.terminate()
+        proc.wait(5)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"run_analysis x{args.iterations}：平均 {avg_items:.1f} 則新聞 / 次；批次 {args.batch_top} 檔，失敗 {failed}")
+    print("最慢的來源 (p95)：" + "、".join(f"{r['op']}/{r['source']} {r['p95_s']:.2f}s" for r in slowest))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=1)
+    if avg_items == 0:
+        print("❌ run_analysis 沒有拿到任何新聞，端點可能沒有指到替身伺服器")
+        return 1
+    if empty:
+        # 某個來源默默壞掉 (例如沒裝 Chromium) 時延遲會變好看，不能拿來比較或更新基準
+        print("❌ 有來源沒拿到新聞：" + "、".join(f"{name} {n}/{args.iterations} 次" for name, n in empty.items()))
+        if not args.error:
+            return 1
+        print("   (有 --error 錯誤注入，僅供參考)")
+
+    if args.update_baseline:
+        record = dict(results, python=platform.python_version(), machine=platform.machine(), updated_at=time.strftime("%Y-%m-%d"))
+        with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+            json.dump(record, f, indent=1)
+            f.write("\n")
+        print(f"已更新基準：{BASELINE_PATH}")
+        for name in METRICS: print(f"  {name:<24} {results[name]:>10.1f}")
+        return 0
+
+    if args.error or args.latency or args.no_latency:
+        print("自訂延遲 / 錯誤注入的結果不和基準比較：")
+        for name in METRICS: print(f"  {name:<24} {results[name]:>10.1f}")
+        return 0
+    if not os.path.exists(BASELINE_PATH):
+        print("還沒有基準值，請先跑 --update-baseline")
+        return 1
+    with open(BASELINE_PATH, encoding="utf-8") as f:
+        baseline = json.load(f)
+    print("與基準比較：")
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"❌ 效能退步：{', '.join(regressions)}")
+        return 1
+    print("✅ 沒有超出容許範圍的退步")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
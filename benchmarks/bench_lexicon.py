@@ -0,0 +1,81 @@
+"""關鍵字詞典評分的微基準：舊版寫法的逐詞 `in` 迴圈 vs lexicon.py。
+
+逐檔呼叫 score_news 是 app / 批次實際走的路徑 (每檔幾十則，和舊版一樣逐詞比對，目標是不比舊版慢)；
+整批 score_news_lists 的向量化掃描只在一次評很多檔時才划算。
+
+    python benchmarks/bench_lexicon.py --stocks 1500 --per-stock 30
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lexicon import DEFAULT_NEGATIVE, DEFAULT_POSITIVE, get_lexicon  # noqa: E402
+
+FILLER = "台積電鴻海聯發科營收法人表示市場公司股價今年訂單客戶產能供應鏈半導體需求預估第季月日的了在與及將"
+
+
+def loop_score(news_list):
+    # 速度對照組：原本 calculate_score_keyword_fallback 的迴圈，但詞表用去重後的 DEFAULT_*，
+    # 不是原本的評分器 (原本負面清單「重挫」「利空」各出現兩次、會扣兩次分)
+    if not news_list: return 0
+    base_score = 50
+    for news in news_list:
+        content = news['title'] + " " + (news.get('snippet', '') or "")
+        for w in DEFAULT_POSITIVE:
+            if w in content: base_score += 5
+        for w in DEFAULT_NEGATIVE:
+            if w in content: base_score -= 5
+    return max(0, min(100, base_score))
+
+
+def make_news(rng, title_len=28, snippet_len=90, hit_rate=0.04):
+    words = DEFAULT_POSITIVE + DEFAULT_NEGATIVE
+
+    def text(n):
+        out = []
+        while len(out) < n:
+            out.append(rng.choice(words) if rng.random() < hit_rate else rng.choice(FILLER))
+        return "".join(out)
+
+    return {'title': text(title_len), 'snippet': text(snippet_len), 'source': "bench"}
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stocks", type=int, default=1500)
+    parser.add_argument("--per-stock", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    news_lists = [[make_news(rng) for _ in range(args.per_stock)] for _ in range(args.stocks)]
+    lexicon = get_lexicon()
+    lexicon.score_news_lists(news_lists[:1])  # 暖身
+
+    loop_t, loop = timed(lambda: [loop_score(n) for n in news_lists], args.repeat)
+    batch_t, batch = timed(lambda: lexicon.score_news_lists(news_lists), args.repeat)
+    single_t, single = timed(lambda: [lexicon.score_news(n) for n in news_lists], args.repeat)
+
+    assert list(batch) == loop == single, "分數與逐詞迴圈 (去重詞表) 不一致"
+    articles = args.stocks * args.per_stock
+    print(f"{args.stocks} 檔 x {args.per_stock} 則 = {articles} 則新聞 (取 {args.repeat} 次最佳)")
+    for label, seconds in (("舊版寫法逐詞迴圈", loop_t), ("逐檔呼叫 score_news", single_t), ("整批 score_news_lists", batch_t)):
+        print(f"  {label:<22} {seconds * 1000:8.1f} ms  {articles / seconds:>10,.0f} 則/秒  x{loop_t / seconds:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""離線替身伺服器：用 benchmarks/fixtures/ 裡錄好的回應扮演所有外部來源。
+
+    python benchmarks/fixture_server.py --port 8765 --latency rss=0.3:0.1 --error cnyes=0.2:503
+
+路徑對應 (把 scrapers / llm_client 的端點環境變數指過來，見 endpoint_env())：
+    GET  /rss/search                     Google News RSS (依 q 裡的 site: 過濾來源)
+    GET  /cnyes/news/keyword             鉅亨網 news/keyword JSON
+    GET  /yahoo/quote/{code}.TW/news     Yahoo 個股新聞頁 HTML
+    GET  /yahoo/search                   Yahoo 股票搜尋結果
+    POST /tradingview/scan               TradingView 成交量排行
+    GET  /gemini/models                  Gemini 模型清單
+    POST /gemini/models/{m}:generateContent / :streamGenerateContent (SSE)
+    GET  /bench-static/*                 頁面上的圖片、字型、CSS、JS (內容是假的)
+
+fixtures 的發布時間以 manifest.json 的 recorded_at 為準，回應時整體平移到「現在」，
+新舊比例維持錄製當下的樣子。換成真的錄製檔時，{{code}} / {{name}} 會被換成查詢的股票。
+RSS / 鉅亨網 / Yahoo 回應帶弱 ETag (同一個查詢 ETAG_BUCKET 秒內不變)，If-None-Match 相符時回 304。
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import time
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from urllib.parse import urlparse
+
+from aiohttp import web
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+# 各類路徑的預設延遲 (平均秒數, 抖動)，大約是從台灣連線時的實際量級
+DEFAULT_LATENCY = {
+    "rss": (0.35, 0.15), "cnyes": (0.15, 0.05), "yahoo": (0.6, 0.2), "tradingview": (0.3, 0.1),
+    "gemini": (1.2, 0.3), "static": (0.05, 0.02),
+}
+STREAM_CHUNK_DELAY = 0.05  # Gemini SSE 每段之間的間隔
+ETAG_BUCKET = 60           # 秒
+KINDS = sorted(DEFAULT_LATENCY)
+
+
+def endpoint_env(base_url):
+    # 讓 scrapers / llm_client 改打替身伺服器的環境變數 (必須在 import 它們之前設定)
+    return {
+        "GOOGLE_NEWS_RSS_URL": f"{base_url}/rss/search",
+        "CNYES_NEWS_URL": f"{base_url}/cnyes/news/keyword",
+        "YAHOO_STOCK_URL": f"{base_url}/yahoo",
+        "TRADINGVIEW_SCAN_URL": f"{base_url}/tradingview/scan",
+        "GEMINI_BASE_URL": f"{base_url}/gemini",
+    }
+
+
+def parse_spec(spec, default_second):
+    # "rss=0.3:0.1" -> ("rss", 0.3, 0.1)
+    kind, _, value = spec.partition("=")
+    if kind not in DEFAULT_LATENCY:
+        raise argparse.ArgumentTypeError(f"未知的路徑類別：{kind} (可用：{', '.join(KINDS)})")
+    first, _, second = value.partition(":")
+    return kind, float(first), float(second) if second else default_second
+
+
+class FixtureServer:
+    def __init__(self, latency=None, errors=None, seed=None, fixtures_dir=FIXTURES_DIR):
+        self.latency = dict(DEFAULT_LATENCY, **(latency or {}))
+        self.errors = errors or {}  # kind -> (比例, HTTP 狀態碼)
+        self.rng = random.Random(seed)
+        self.requests = {kind: 0 for kind in KINDS}
+        self.injected = {kind: 0 for kind in KINDS}
+        self.not_modified = {kind: 0 for kind in KINDS}
+        self.dir = fixtures_dir
+        with open(self._path("manifest.json"), encoding="utf-8") as f:
+            self.recorded_at = datetime.fromisoformat(json.load(f)["recorded_at"])
+        with open(self._path("tradingview_scan.json"), encoding="utf-8") as f:
+            self.names = {row["d"][0]: row["d"][1] for row in json.load(f)["data"]}
+        self._cache = {}
+
+    def _path(self, name):
+        return os.path.join(self.dir, name)
+
+    def _fixture(self, name):
+        if name not in self._cache:
+            with open(self._path(name), encoding="utf-8") as f:
+                self._cache[name] = f.read()
+        return self._cache[name]
+
+    def _render(self, name, code):
+        return self._fixture(name).replace("{{code}}", code).replace("{{name}}", self.names.get(code, code))
+
+    def _shift(self):
+        return datetime.now(timezone.utc) - self.recorded_at
+
+    @web.middleware
+    async def middleware(self, request, handler):
+        kind = request.path.strip("/").split("/")[0]
+        kind = {"bench-static": "static"}.get(kind, kind)
+        if kind in self.requests:
+            self.requests[kind] += 1
+            mean, jitter = self.latency[kind]
+            delay = max(0.0, mean + self.rng.uniform(-jitter, jitter))
+            if delay: await asyncio.sleep(delay)
+            rate, status = self.errors.get(kind, (0.0, 503))
+            if rate and self.rng.random() < rate:
+                self.injected[kind] += 1
+                return web.Response(status=status, text=f"injected {status}")
+        return await handler(request)
+
+    def _etag(self, request):
+        # 發布時間每秒都在平移，內容其實一直在變；用弱 ETag 把同一段時間視為同一版
+        bucket = int(time.time() // ETAG_BUCKET)
+        return 'W/"%s"' % hashlib.sha1(f"{request.path_qs}|{bucket}".encode("utf-8")).hexdigest()[:16]
+
+    def _not_modified(self, request, kind, etag):
+        if request.headers.get("If-None-Match") == etag:
+            self.not_modified[kind] += 1
+            return web.Response(status=304, headers={"ETag": etag})
+        return None
+
+    async def rss(self, request):
+        etag = self._etag(request)
+        cached = self._not_modified(request, "rss", etag)
+        if cached is not None: return cached
+        query = request.query.get("q", "")
+        code = (re.search(r"\d{4,6}", query) or re.search(r"\S+", query or "x")).group(0)
+        sites = re.findall(r"site:([\w.-]+)", query)
+        xml = self._render("google_news_rss.xml", code)
+        shift = self._shift()
+
+        def keep(item):
+            if not sites: return True
+            host = urlparse(re.search(r'<source url="([^"]+)"', item).group(1)).hostname or ""
+            return any(host == d or host.endswith("." + d) for d in sites)
+
+        def move(match):
+            return f"<pubDate>{format_datetime(parsedate_to_datetime(match.group(1)) + shift, usegmt=True)}</pubDate>"
+
+        head, _, rest = xml.partition("<item>")
+        items = ["<item>" + part for part in rest.split("<item>")] if rest else []
+        tail = ""
+        if items:
+            items[-1], sep, tail = items[-1].partition("</channel>")
+            tail = sep + tail
+        body = head + "".join(re.sub(r"<pubDate>([^<]+)</pubDate>", move, item) for item in items if keep(item)) + tail
+        return web.Response(text=body, content_type="application/xml", charset="utf-8", headers={"ETag": etag})
+
+    async def cnyes(self, request):
+        etag = self._etag(request)
+        cached = self._not_modified(request, "cnyes", etag)
+        if cached is not None: return cached
+        data = json.loads(self._render("cnyes_keyword.json", request.query.get("q", "")))
+        shift = int(self._shift().total_seconds())
+        for item in data["data"]["items"]:
+            item["publishAt"] += shift
+        return web.json_response(data, dumps=lambda d: json.dumps(d, ensure_ascii=False), headers={"ETag": etag})
+
+    async def yahoo_news(self, request):
+        etag = self._etag(request)
+        cached = self._not_modified(request, "yahoo", etag)
+        if cached is not None: return cached
+        return web.Response(text=self._render("yahoo_quote_news.html", request.match_info["code"]), content_type="text/html", headers={"ETag": etag})
+
+    async def yahoo_search(self, request):
+        query = request.query.get("p", "").strip()
+        code = query if query in self.names else next((c for c, n in self.names.items() if n == query), None)
+        if code is None:
+            return web.Response(text="<html><body>查無結果</body></html>", content_type="text/html")
+        return web.Response(text=self._render("yahoo_search.html", code), content_type="text/html")
+
+    async def tradingview(self, request):
+        try:
+            payload = await request.json()
+        except ValueError:
+            payload = {}
+        data = json.loads(self._fixture("tradingview_scan.json"))
+        start, end = (payload.get("range") or [0, len(data["data"])])[:2]
+        data["data"] = data["data"][start:end]
+        return web.json_response(data, dumps=lambda d: json.dumps(d, ensure_ascii=False))
+
+    async def gemini(self, request):
+        tail = request.match_info["tail"]
+        if request.method == "GET" and tail == "models":
+            return web.Response(text=self._fixture("gemini_models.json"), content_type="application/json")
+        report = self._fixture("gemini_report.md")
+        if tail.endswith(":generateContent"):
+            return web.json_response({"candidates": [{"content": {"parts": [{"text": report}], "role": "model"}, "finishReason": "STOP"}]})
+        if tail.endswith(":streamGenerateContent"):
+            resp = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+            await resp.prepare(request)
+            for i in range(0, len(report), 48):
+                chunk = {"candidates": [{"content": {"parts": [{"text": report[i:i + 48]}], "role": "model"}}]}
+                await resp.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\r\n\r\n".encode("utf-8"))
+                await asyncio.sleep(STREAM_CHUNK_DELAY)
+            await resp.write_eof()
+            return resp
+        raise web.HTTPNotFound()
+
+    async def static(self, request):
+        # 假的靜態資源：大小接近真實頁面上的圖片 / 字型，給瀏覽器路徑一點負擔
+        name = request.match_info["name"]
+        size = 48 * 1024 if name.endswith((".jpg", ".png", ".woff2")) else 8 * 1024
+        return web.Response(body=b"\0" * size, content_type="application/octet-stream")
+
+    async def stats(self, request):
+        return web.json_response({"requests": self.requests, "injected": self.injected, "not_modified": self.not_modified})
+
+    def app(self):
+        app = web.Application(middlewares=[self.middleware])
+        app.router.add_get("/rss/search", self.rss)
+        app.router.add_get("/cnyes/news/keyword", self.cnyes)
+        app.router.add_get("/yahoo/quote/{code}.TW/news", self.yahoo_news)
+        app.router.add_get("/yahoo/search", self.yahoo_search)
+        app.router.add_post("/tradingview/scan", self.tradingview)
+        app.router.add_route("*", "/gemini/{tail:.+}", self.gemini)
+        app.router.add_get("/bench-static/{name}", self.static)
+        app.router.add_get("/_stats", self.stats)
+        return app
+
+
+async def serve(server, host, port):
+    runner = web.AppRunner(server.app())
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    # 啟動完成：第一行輸出給 bench_e2e 讀
+    print(json.dumps({"ready": True, "base_url": f"http://{host}:{port}", "started_at": time.time()}), flush=True)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765, help="0 代表隨機挑一個空的 port")
+    parser.add_argument("--latency", action="append", default=[], metavar="KIND=MEAN[:JITTER]", help=f"覆寫延遲 (秒)，KIND：{', '.join(KINDS)}")
+    parser.add_argument("--error", action="append", default=[], metavar="KIND=RATE[:STATUS]", help="錯誤注入比例與狀態碼 (預設 503)")
+    parser.add_argument("--no-latency", action="store_true", help="所有延遲歸零 (只量程式本身的開銷)")
+    parser.add_argument("--seed", type=int, default=1234)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    latency = {kind: (0.0, 0.0) for kind in KINDS} if args.no_latency else {}
+    for spec in args.latency:
+        kind, mean, jitter = parse_spec(spec, 0.0)
+        latency[kind] = (mean, jitter)
+    errors = {}
+    for spec in args.error:
+        kind, rate, status = parse_spec(spec, 503)
+        errors[kind] = (rate, int(status))
+    server = FixtureServer(latency, errors, args.seed)
+    try:
+        asyncio.run(serve(server, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
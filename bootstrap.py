@@ -0,0 +1,107 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from news_cache import CACHE_DIR
+
+# ===========================
+# 0. 環境準備 (只做一次)
+# ===========================
+# Chromium 是否已安裝記在 .cache/bootstrap.json，playwright 版本沒變就不再檢查；
+# 真的要開瀏覽器時 (browser_pool) 才會確認，不擋 import 與第一次畫面。
+# 同時記錄啟動時間點，用來追蹤每個版本的 time-to-interactive。
+BOOT_T0 = time.perf_counter()
+READY_MARKER = os.path.join(CACHE_DIR, "bootstrap.json")
+STARTUP_LOG = os.path.join(CACHE_DIR, "startup_timings.jsonl")
+INSTALL_RETRY_AFTER = 3600
+
+_timings = {}
+_reported = False
+_chromium_ready = False
+_install_lock = threading.Lock()
+_prepare_started = False
+
+
+def mark(name):
+    # 只記第一次 (同一程序內 rerun 不覆蓋)
+    _timings.setdefault(name, time.perf_counter() - BOOT_T0)
+
+
+def startup_timings():
+    return dict(_timings)
+
+
+def record_startup(version):
+    global _reported
+    if _reported:
+        return
+    _reported = True
+    entry = {"version": version, "at": round(time.time(), 3), **{k: round(v, 4) for k, v in _timings.items()}}
+    print(f"[startup] {json.dumps(entry, ensure_ascii=False)}", file=sys.stderr)
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(STARTUP_LOG, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    except OSError:
+        pass
+
+
+def _playwright_version():
+    try:
+        from importlib.metadata import version
+        return version("playwright")
+    except Exception:
+        return None
+
+
+def _load_marker():
+    try:
+        with open(READY_MARKER, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_marker(marker):
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(READY_MARKER, "w", encoding="utf-8") as f:
+            json.dump(marker, f)
+    except OSError:
+        pass
+
+
+def ensure_chromium():
+    # 同步函式，請在 worker thread 呼叫；回傳 Chromium 是否可用
+    global _chromium_ready
+    if _chromium_ready:
+        return True
+    with _install_lock:
+        version = _playwright_version()
+        marker = _load_marker()
+        if marker.get("playwright") == version:
+            if marker.get("chromium"):
+                _chromium_ready = True
+                return True
+            if time.time() - marker.get("checked_at", 0) < INSTALL_RETRY_AFTER:
+                return False
+        try:
+            subprocess.run([sys.executable, "-m", "playwright", "install", "chromium"], check=True, capture_output=True, timeout=900)
+            ok = True
+        except Exception:
+            ok = False
+        _save_marker({"playwright": version, "chromium": ok, "checked_at": time.time()})
+        _chromium_ready = ok
+        return ok
+
+
+def prepare_in_background():
+    # 開站後在背景先把 Chromium 準備好，第一次真的要用瀏覽器時就不用等安裝
+    global _prepare_started
+    if _prepare_started:
+        return
+    _prepare_started = True
+    threading.Thread(target=ensure_chromium, name="bootstrap", daemon=True).start()
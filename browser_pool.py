@@ -0,0 +1,174 @@
+import asyncio
+import os
+import threading
+from contextlib import asynccontextmanager
+
+from async_runtime import add_shutdown_hook, in_runtime
+from bootstrap import ensure_chromium
+
+# ===========================
+# 🌐 共用 Chromium 池
+# ===========================
+# 每個程序只開一個 Chromium，爬蟲各自拿獨立的 context/page (cookie 互不干擾)。
+# - 同時使用的 context 數量受 BROWSER_POOL_SIZE 限制
+# - 瀏覽器斷線 (crash) 或使用次數達 BROWSER_MAX_USES 時自動換新
+# - 換新時舊瀏覽器等手上的 context 都歸還後才關閉
+BROWSER_POOL_SIZE = int(os.environ.get("BROWSER_POOL_SIZE", "4"))
+BROWSER_MAX_USES = int(os.environ.get("BROWSER_MAX_USES", "200"))
+BROWSER_LAUNCH_ARGS = ["--disable-dev-shm-usage"]
+# 關掉 Chromium 沙箱只在容器裡沒有權限建立沙箱時才需要 (會載入第三方網頁，預設不關)
+if os.environ.get("BROWSER_NO_SANDBOX") == "1":
+    BROWSER_LAUNCH_ARGS.append("--no-sandbox")
+BLOCKED_RESOURCE_TYPES = {"image", "media", "font", "stylesheet"}
+
+
+class BrowserPool:
+    def __init__(self, max_contexts=BROWSER_POOL_SIZE, max_uses=BROWSER_MAX_USES, headless=True):
+        self.max_contexts = max_contexts
+        self.max_uses = max_uses
+        self.headless = headless
+        self.launches = 0
+        self._playwright = None
+        self._browser = None
+        self._uses = 0
+        self._leases = {}
+        self._sem = None
+        self._lock = None
+        self._closed = False
+
+    def _check_loop(self):
+        if not in_runtime():
+            raise RuntimeError("BrowserPool 只能在 async_runtime 的 loop 上使用 (請用 run_sync / on_runtime)")
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(self.max_contexts)
+            self._lock = asyncio.Lock()
+
+    def _healthy(self, browser):
+        return browser is not None and browser.is_connected()
+
+    async def _launch(self):
+        if self._playwright is None:
+            # Playwright 只在第一次真的要開瀏覽器時才載入
+            await asyncio.to_thread(ensure_chromium)
+            from playwright.async_api import async_playwright
+            self._playwright = await async_playwright().start()
+        browser = await self._playwright.chromium.launch(headless=self.headless, args=BROWSER_LAUNCH_ARGS)
+        self.launches += 1
+        self._uses = 0
+        self._leases[browser] = 0
+        return browser
+
+    async def _acquire_browser(self):
+        async with self._lock:
+            if self._closed:
+                raise RuntimeError("BrowserPool 已關閉")
+            current = self._browser
+            if not self._healthy(current) or self._uses >= self.max_uses:
+                self._browser = await self._launch()
+                if current is not None:
+                    await self._retire(current)
+            self._uses += 1
+            self._leases[self._browser] += 1
+            return self._browser
+
+    async def _release_browser(self, browser):
+        self._leases[browser] = self._leases.get(browser, 1) - 1
+        if browser is not self._browser:
+            await self._retire(browser)
+
+    async def _retire(self, browser):
+        # 沒人在用才真正關閉，否則等最後一個 context 歸還
+        if self._leases.get(browser, 0) > 0 and self._healthy(browser):
+            return
+        self._leases.pop(browser, None)
+        try:
+            await browser.close()
+        except Exception:
+            pass
+
+    @asynccontextmanager
+    async def context(self, **context_kwargs):
+        self._check_loop()
+        async with self._sem:
+            browser = await self._acquire_browser()
+            ctx = None
+            try:
+                try:
+                    ctx = await browser.new_context(**context_kwargs)
+                except Exception:
+                    # 開 context 失敗多半是瀏覽器掛了，換一台再試一次
+                    if browser is self._browser:
+                        self._uses = self.max_uses
+                    await self._release_browser(browser)
+                    browser = None
+                    browser = await self._acquire_browser()
+                    ctx = await browser.new_context(**context_kwargs)
+                yield ctx
+            finally:
+                if ctx is not None:
+                    try:
+                        await ctx.close()
+                    except Exception:
+                        pass
+                if browser is not None:
+                    await self._release_browser(browser)
+
+    @asynccontextmanager
+    async def page(self, user_agent=None, **context_kwargs):
+        if user_agent:
+            context_kwargs["user_agent"] = user_agent
+        async with self.context(**context_kwargs) as ctx:
+            yield await ctx.new_page()
+
+    def stats(self):
+        return {
+            "launches": self.launches,
+            "connected": self._healthy(self._browser),
+            "uses": self._uses,
+            "in_use": sum(self._leases.values()),
+            "max_contexts": self.max_contexts,
+        }
+
+    async def close(self):
+        self._closed = True
+        for browser in list(self._leases):
+            try:
+                await browser.close()
+            except Exception:
+                pass
+        self._leases.clear()
+        self._browser = None
+        if self._playwright is not None:
+            try:
+                await self._playwright.stop()
+            except Exception:
+                pass
+            self._playwright = None
+
+
+async def block_resources(page, resource_types=BLOCKED_RESOURCE_TYPES):
+    # 只需要 DOM 的頁面：圖片、影音、字型、CSS 一律擋掉，省頻寬也省渲染時間
+    async def _route(route):
+        if route.request.resource_type in resource_types:
+            await route.abort()
+        else:
+            await route.continue_()
+    await page.route("**/*", _route)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_browser_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool._closed:
+            _pool = BrowserPool()
+            add_shutdown_hook(_close_pool)
+    return _pool
+
+
+async def _close_pool():
+    if _pool is not None:
+        await _pool.close()
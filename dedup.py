@@ -0,0 +1,122 @@
+import re
+import unicodedata
+import zlib
+
+import numpy as np
+
+# ===========================
+# 🧹 跨來源近似重複新聞合併
+# ===========================
+# 同一則中央社 / 通訊社稿件常以略為不同的標題出現在多家媒體。
+# 做法：標題 (與有內容的摘要) 切成字元 2-gram → MinHash 簽章 → LSH 分桶找候選，
+# 只比對同桶的候選再用 Jaccard 確認，整體接近線性時間；最後用 union-find 分群，
+# 每群留一則代表，其餘來源記在 also_in。
+DEDUP_NUM_PERM = 48
+DEDUP_BANDS = 12              # 12 組 x 4 列，候選門檻約 Jaccard 0.54
+DEDUP_TITLE_THRESHOLD = 0.6
+DEDUP_SNIPPET_THRESHOLD = 0.6
+DEDUP_TITLE_FLOOR = 0.4       # 摘要高度相似時，標題相似度只需達到這個值
+GENERIC_SNIPPETS = {"", "無摘要", "Yahoo 焦點新聞 (最新)"}
+
+_PRIME = (1 << 61) - 1
+_rng = np.random.default_rng(20240101)
+_A = _rng.integers(1, 1 << 31, size=DEDUP_NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, 1 << 31, size=DEDUP_NUM_PERM, dtype=np.uint64)
+_STRIP = re.compile(r"[\s\W_]+", re.UNICODE)
+
+
+def normalize_text(text):
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    return _STRIP.sub("", text)
+
+
+def shingles(text):
+    if len(text) < 2:
+        return {text} if text else set()
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+def minhash(grams):
+    if not grams:
+        return np.full(DEDUP_NUM_PERM, np.iinfo(np.uint64).max, dtype=np.uint64)
+    hashes = np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams))
+    # (a * x + b) mod p，x < 2^32、a,b < 2^31，乘積不會超過 uint64
+    return ((_A[:, None] * hashes[None, :] + _B[:, None]) % _PRIME).min(axis=1)
+
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def _informative_snippet(news, title_norm):
+    snippet = (news.get('snippet') or "").strip()
+    if snippet in GENERIC_SNIPPETS:
+        return ""
+    snippet_norm = normalize_text(snippet)
+    # Google News 的摘要常常就是標題 + 媒體名稱，這種不算有內容
+    if snippet_norm.startswith(title_norm):
+        return ""
+    return snippet_norm
+
+
+def find_clusters(news_list):
+    n = len(news_list)
+    parent = list(range(n))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    titles, snippets, buckets = [], [], {}
+    rows = DEDUP_NUM_PERM // DEDUP_BANDS
+    for i, news in enumerate(news_list):
+        title_norm = normalize_text(news.get('title'))
+        title_grams = shingles(title_norm)
+        titles.append(title_grams)
+        snippets.append(shingles(_informative_snippet(news, title_norm)))
+        signature = minhash(title_grams)
+        for band in range(DEDUP_BANDS):
+            key = (band, signature[band * rows:(band + 1) * rows].tobytes())
+            buckets.setdefault(key, []).append(i)
+
+    checked = set()
+    for members in buckets.values():
+        for x in range(len(members)):
+            for y in range(x + 1, len(members)):
+                i, j = members[x], members[y]
+                if (i, j) in checked:
+                    continue
+                checked.add((i, j))
+                title_sim = jaccard(titles[i], titles[j])
+                if title_sim >= DEDUP_TITLE_THRESHOLD or (
+                    title_sim >= DEDUP_TITLE_FLOOR and jaccard(snippets[i], snippets[j]) >= DEDUP_SNIPPET_THRESHOLD
+                ):
+                    parent[find(i)] = find(j)
+
+    clusters = {}
+    for i in range(n):
+        clusters.setdefault(find(i), []).append(i)
+    # 依每群第一次出現的位置排序，維持原本的來源順序
+    return sorted(clusters.values(), key=lambda members: members[0])
+
+
+def dedupe_news(news_list):
+    # 回傳去重後的新清單；代表新聞多了 also_in (其他來源) 欄位，原本的 dict 不會被修改
+    result = []
+    for members in find_clusters(news_list):
+        # 代表：摘要最有內容的那則，同分取最早出現的
+        best = max(members, key=lambda i: (len(news_list[i].get('snippet') or "") * (news_list[i].get('snippet') not in GENERIC_SNIPPETS), -i))
+        representative = dict(news_list[best])
+        others = []
+        for i in members:
+            source = news_list[i]['source']
+            if i != best and source != representative['source'] and source not in others:
+                others.append(source)
+        if others:
+            representative['also_in'] = others
+        result.append(representative)
+    return result
@@ -0,0 +1,151 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from archive import article_uid
+from news_cache import CACHE_DIR
+
+# ===========================
+# 🔁 增量抓取 (游標 + 條件式請求)
+# ===========================
+# 每個 (股票, 來源) 記一個游標：上次的 ETag / Last-Modified、看過的 GUID / 連結、
+# 最新的發布時間，以及上次合併後的結果。下一次抓取時：
+#   - 帶 If-None-Match / If-Modified-Since，伺服器回 304 就直接沿用上次的結果 (幾乎 0 流量)
+#   - 回 200 時只處理沒看過的新聞；串流中連續遇到 DELTA_KNOWN_RUN 則看過、而且比上次最新的還舊的
+#     新聞就提早收工 (Google News 搜尋結果不保證依時間排序，不能只看「看過」)
+#   - 新的在前、上次的在後合併，再依新鮮度過濾
+# NEWS_DELTA=0 可關閉 (每次都當第一次抓)。
+CURSOR_PATH = os.path.join(CACHE_DIR, "news_cursors.sqlite3")
+DELTA_ENABLED = os.environ.get("NEWS_DELTA", "1") != "0"
+DELTA_KNOWN_RUN = 5          # 連續這麼多則看過的舊聞 (早於 last_published) 就不再往下讀
+CURSOR_SEEN_MAX = 300        # 每個游標最多記幾個看過的 GUID
+CURSOR_ENTRIES_MAX = 30      # 合併後每個來源保留的新聞數 (前面的過期時由後面的遞補)
+CURSOR_MAX_AGE = 4 * 86400   # 太久沒更新的游標當作不存在 (裡面的新聞也都過期了)
+
+
+class Cursor:
+    def __init__(self, store, stock_code, feed, etag=None, last_modified=None, last_published=None, seen=(), entries=()):
+        self.store = store
+        self.stock_code = stock_code
+        self.feed = feed
+        self.etag = etag
+        self.last_modified = last_modified
+        self.last_published = last_published
+        self.seen = dict.fromkeys(seen)  # 保持加入順序，超過上限時從最舊的丟
+        self.entries = [tuple(e) for e in entries]  # [(發布時間 或 None, news)]
+        self.known_run = 0
+        self.skipped = 0
+
+    def headers(self):
+        # 條件式請求標頭 (沒有就回傳空 dict)
+        headers = {}
+        if self.etag: headers["If-None-Match"] = self.etag
+        if self.last_modified: headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+    def is_new(self, item, published=None):
+        # 記下這一則；回傳 False 代表上次就看過，不必再處理
+        # published (發布時間) 早於 last_published 的舊聞才算進 known_run，沒有時間的不算
+        uid = article_uid(item)
+        if uid in self.seen:
+            self.skipped += 1
+            older = published is not None and self.last_published is not None and published < self.last_published
+            self.known_run = self.known_run + 1 if older else 0
+            return False
+        self.known_run = 0
+        self.seen[uid] = None
+        return True
+
+    @property
+    def exhausted(self):
+        return self.known_run >= DELTA_KNOWN_RUN
+
+    def commit(self, entries, status=200, etag=None, last_modified=None, max_age=None, replace=False):
+        # entries：這次新處理的 [(發布時間, news)]；回傳合併後的 news 清單 (新的在前) 並存檔
+        # replace=True：這次的回應就是完整清單 (例如沒有發布時間的 Yahoo)，不併入舊的
+        if status == 200:
+            self.etag, self.last_modified = etag, last_modified
+            merged = list(entries) if replace else list(entries) + self.entries
+        else:
+            merged = self.entries  # 304：內容沒變
+        now = time.time()
+        out, links, per_source = [], set(), {}
+        for published, news in merged:
+            if max_age is not None and published is not None and now - published > max_age:
+                continue
+            key = article_uid(news)
+            if key in links: continue
+            links.add(key)
+            # 上限分來源算：合併查詢的游標裡，一家新聞多不會把別家的備位擠掉
+            source = news.get("source")
+            if per_source.get(source, 0) >= CURSOR_ENTRIES_MAX: continue
+            per_source[source] = per_source.get(source, 0) + 1
+            out.append((published, news))
+        self.entries = out
+        dates = [p for p, _ in entries if p is not None]
+        if dates: self.last_published = max(dates + ([self.last_published] if self.last_published else []))
+        while len(self.seen) > CURSOR_SEEN_MAX:
+            self.seen.pop(next(iter(self.seen)))
+        if self.store is not None:
+            self.store.save(self)
+        return [news for _, news in self.entries]
+
+
+class CursorStore:
+    def __init__(self, path=CURSOR_PATH):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cursors ("
+            " stock_code TEXT NOT NULL, feed TEXT NOT NULL, etag TEXT, last_modified TEXT, last_published REAL,"
+            " seen TEXT NOT NULL, entries TEXT NOT NULL, updated_at REAL NOT NULL,"
+            " PRIMARY KEY (stock_code, feed))"
+        )
+        self._conn.commit()
+
+    def get(self, stock_code, feed):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT etag, last_modified, last_published, seen, entries, updated_at FROM cursors WHERE stock_code = ? AND feed = ?",
+                (stock_code, feed),
+            ).fetchone()
+        if row is None or time.time() - row[5] > CURSOR_MAX_AGE:
+            return Cursor(self, stock_code, feed)
+        etag, last_modified, last_published, seen, entries, _ = row
+        return Cursor(self, stock_code, feed, etag, last_modified, last_published, json.loads(seen), json.loads(entries))
+
+    def save(self, cursor):
+        row = (
+            cursor.stock_code, cursor.feed, cursor.etag, cursor.last_modified, cursor.last_published,
+            json.dumps(list(cursor.seen), ensure_ascii=False), json.dumps(cursor.entries, ensure_ascii=False), time.time(),
+        )
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO cursors VALUES (?, ?, ?, ?, ?, ?, ?, ?)", row)
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM cursors")
+            self._conn.commit()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_cursor(stock_code, feed):
+    # NEWS_DELTA=0 時回傳不存檔的空游標，行為等同每次都重新抓
+    global _store
+    if not DELTA_ENABLED:
+        return Cursor(None, stock_code, feed)
+    with _store_lock:
+        if _store is None:
+            _store = CursorStore()
+    return _store.get(stock_code, feed)
@@ -0,0 +1,44 @@
+import threading
+
+import aiohttp
+
+from async_runtime import add_shutdown_hook, in_runtime
+
+# ===========================
+# 🔌 共用 HTTP 連線池 (keep-alive)
+# ===========================
+# 一個程序一個 ClientSession，掛在 async_runtime 的 loop 上，
+# 所有來源共用連線池，同一主機的後續請求可以直接沿用已建立的 TLS 連線。
+HTTP_POOL_LIMIT = 64
+HTTP_POOL_LIMIT_PER_HOST = 12
+HTTP_DEFAULT_TIMEOUT = 20
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    global _session
+    if not in_runtime():
+        raise RuntimeError("http_client 只能在 async_runtime 的 loop 上使用 (請用 run_sync / on_runtime)")
+    with _session_lock:
+        if _session is None or _session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=HTTP_POOL_LIMIT,
+                limit_per_host=HTTP_POOL_LIMIT_PER_HOST,
+                ttl_dns_cache=300,
+                keepalive_timeout=60,
+            )
+            _session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=HTTP_DEFAULT_TIMEOUT, connect=5),
+            )
+            add_shutdown_hook(close_session)
+    return _session
+
+
+async def close_session():
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
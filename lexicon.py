@@ -0,0 +1,151 @@
+import json
+import os
+import threading
+
+import numpy as np
+
+# ===========================
+# 📖 關鍵字詞典評分 (AI 不可用時的備援)
+# ===========================
+# 單檔 (app / 批次的備援評分，通常十幾則)：去重後的詞表逐詞 `in` 比對，沒有 numpy 的固定開銷。
+# 多檔一次算 (score_news_lists，例如幾百檔以上重新評分)：整批新聞接成一個字串轉成 Unicode 碼位陣列，
+# 先用「詞首字」對照表一次找出所有可能起點，再依詞首字分組、逐字向量化比對後續字元，
+# 得到 (新聞, 詞) 命中矩陣後乘上權重。兩條路徑結果相同。
+# 與舊版的差別：舊的負面清單裡「重挫」「利空」各出現兩次 (扣 10 分)，詞典去重後每個詞只算一次
+# (例如「台積電重挫」舊版 40、現在 45)；其餘與逐詞 `in` 比對相同。
+# 規則不變：每則新聞每個詞最多算一次，每檔股票 50 + 加總後夾在 0~100，沒有新聞為 0。
+LEXICON_PATH = os.environ.get("LEXICON_PATH", "")
+LEXICON_STEP = 5
+BASE_SCORE = 50
+SMALL_BATCH = 80  # 新聞數少於這個值時直接逐詞比對，numpy 的固定開銷 (約 1 ms) 反而比較大
+
+DEFAULT_POSITIVE = ["上漲", "飆", "創高", "買超", "強勢", "超預期", "取得", "超越", "利多", "成長", "收益", "噴", "漲停", "旺", "攻頂", "受惠", "看好", "翻紅", "驚艷", "AI", "擴產", "先進", "動能", "發威", "領先", "搶單", "季增", "年增", "樂觀", "回溫", "布局", "利潤", "大漲", "完勝", "收購", "賣廠", "百億"]
+DEFAULT_NEGATIVE = ["下跌", "賣", "砍", "觀望", "保守", "不如", "重挫", "外資賣", "縮減", "崩", "跌停", "疲軟", "利空", "修正", "調節", "延後", "衰退", "翻黑", "示警", "重殺", "不如預期", "裁員", "虧損", "大跌", "隱憂"]
+
+_SEP = "\x00"  # 新聞之間的分隔字元，任何詞都不含它，命中不會跨新聞
+
+
+def _weights(words, sign, step):
+    # 支援 ["詞", ...] 或 {"詞": 權重}；負面詞的權重一律當成扣分
+    if isinstance(words, dict):
+        return {w: sign * abs(float(v)) for w, v in words.items()}
+    return {w: sign * step for w in words}
+
+
+class Lexicon:
+    def __init__(self, weights):
+        # weights: {詞: 權重}，正數加分、負數扣分
+        self.words = [w for w in weights if w and _SEP not in w]
+        if not self.words:
+            raise ValueError("詞典是空的")
+        self.weights = np.array([weights[w] for w in self.words], dtype=np.float64)
+        self._pairs = [(w, float(weights[w])) for w in self.words if weights[w]]
+        self._codes = [_code_points(w) for w in self.words]
+        self._max_len = max(len(w) for w in self.words)
+        firsts = sorted({int(c[0]) for c in self._codes})
+        # 碼位 → 詞首字編號 (-1 表示不是任何詞的開頭)
+        self._first_of = np.full(0x110000, -1, dtype=np.int16 if len(firsts) < 32767 else np.int32)
+        self._first_of[firsts] = np.arange(len(firsts))
+        self._groups = [[i for i, c in enumerate(self._codes) if int(c[0]) == f] for f in firsts]
+
+    @classmethod
+    def from_lists(cls, positive, negative, step=LEXICON_STEP):
+        weights = {}
+        for sign, words in ((1, positive), (-1, negative)):
+            for w, v in _weights(words, sign, step).items():
+                weights[w] = weights.get(w, 0) + v
+        return cls(weights)
+
+    @classmethod
+    def load(cls, path):
+        # JSON 格式：{"step": 5, "positive": [...] 或 {"詞": 權重}, "negative": 同上}
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls.from_lists(data.get("positive", []), data.get("negative", []), data.get("step", LEXICON_STEP))
+
+    def match_matrix(self, texts):
+        # (新聞數, 詞數) 的 bool 矩陣：第 i 則新聞是否出現第 j 個詞
+        n = len(texts)
+        if n < SMALL_BATCH:
+            return np.array([[w in t for w in self.words] for t in texts], dtype=bool).reshape(n, len(self.words))
+        hits = np.zeros((n, len(self.words)), dtype=bool)
+        codes = _code_points(_SEP.join(texts) + _SEP * self._max_len)  # 尾端補分隔字元，比對不會越界
+        starts = np.zeros(n, dtype=np.int64)
+        np.cumsum(np.fromiter((len(t) + 1 for t in texts[:-1]), dtype=np.int64, count=n - 1), out=starts[1:])
+
+        first = self._first_of[codes]
+        candidates = np.flatnonzero(first >= 0)
+        order = np.argsort(first[candidates], kind="stable")
+        candidates = candidates[order]
+        bounds = np.searchsorted(first[candidates], np.arange(len(self._groups) + 1))
+        for g, group in enumerate(self._groups):
+            pos = candidates[bounds[g]:bounds[g + 1]]
+            if not len(pos):
+                continue
+            for word_id in group:
+                matched = pos
+                for k, code in enumerate(self._codes[word_id][1:], start=1):
+                    matched = matched[codes[matched + k] == code]
+                if len(matched):
+                    hits[np.searchsorted(starts, matched, side="right") - 1, word_id] = True
+        return hits
+
+    def article_scores(self, texts):
+        # 每則新聞的加減分 (float64 陣列)
+        return self.match_matrix(texts) @ self.weights
+
+    def score_groups(self, texts, group_ids, n_groups=None):
+        # 多檔股票一次算：group_ids[i] 是第 i 則新聞所屬的股票編號，回傳每檔股票的分數 (int64)
+        group_ids = np.asarray(group_ids, dtype=np.int64)
+        if n_groups is None:
+            n_groups = int(group_ids.max()) + 1 if len(group_ids) else 0
+        deltas = np.bincount(group_ids, weights=self.article_scores(texts), minlength=n_groups)
+        counts = np.bincount(group_ids, minlength=n_groups)
+        scores = np.clip(BASE_SCORE + np.rint(deltas), 0, 100).astype(np.int64)
+        scores[counts == 0] = 0
+        return scores
+
+    def score_news_lists(self, news_lists):
+        # [[news, ...], ...] → 每組一個分數
+        texts, group_ids = [], []
+        for g, news_list in enumerate(news_lists):
+            for news in news_list:
+                texts.append(news_text(news))
+                group_ids.append(g)
+        return self.score_groups(texts, group_ids, len(news_lists))
+
+    def score_news(self, news_list):
+        # 單檔：新聞不多時直接逐詞比對
+        if not news_list:
+            return 0
+        if len(news_list) >= SMALL_BATCH:
+            return int(self.score_news_lists([news_list])[0])
+        delta, pairs = 0.0, self._pairs
+        for news in news_list:
+            text = news_text(news)
+            for word, weight in pairs:
+                if word in text: delta += weight
+        return int(min(100, max(0, BASE_SCORE + round(delta))))
+
+
+def _code_points(text):
+    return np.frombuffer(text.encode("utf-32-le", "surrogatepass"), dtype=np.uint32)
+
+
+def news_text(news):
+    return (news.get('title') or "") + " " + (news.get('snippet') or "")
+
+
+_lexicon = None
+_lexicon_lock = threading.Lock()
+
+
+def get_lexicon():
+    global _lexicon
+    with _lexicon_lock:
+        if _lexicon is None:
+            if LEXICON_PATH:
+                _lexicon = Lexicon.load(LEXICON_PATH)
+            else:
+                _lexicon = Lexicon.from_lists(DEFAULT_POSITIVE, DEFAULT_NEGATIVE)
+    return _lexicon
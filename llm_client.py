@@ -0,0 +1,123 @@
+import json
+import os
+import threading
+import time
+
+import aiohttp
+
+from http_client import get_session
+from metrics import add_bytes, measure
+
+# ===========================
+# 🤖 Gemini 連線客戶端
+# ===========================
+# - 可用模型清單依 API Key 快取 (MODEL_CACHE_TTL)，不再每次分析前多打一次 models
+# - 走 http_client 的共用連線池 (keep-alive)
+# - 支援 streamGenerateContent (SSE)，報告可以邊產生邊顯示
+GEMINI_BASE = os.environ.get("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com/v1beta")
+MODEL_PRIORITY = ['models/gemini-1.5-flash', 'models/gemini-1.5-pro', 'models/gemini-1.0-pro', 'models/gemini-pro']
+DEFAULT_MODEL = "models/gemini-pro"
+MODEL_CACHE_TTL = 3600
+MODEL_MISS_TTL = 60  # 查不到模型清單時，短暫沿用預設模型，避免每次都重查
+GENERATE_TIMEOUT = 60
+
+_model_cache = {}
+_model_lock = threading.Lock()
+
+
+class GeminiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(f"Error {status}: {message}")
+        self.status = status
+
+
+def pick_model(models):
+    usable = [m['name'] for m in models if 'generateContent' in m.get('supportedGenerationMethods', [])]
+    for p_model in MODEL_PRIORITY:
+        if p_model in usable:
+            return p_model
+    return usable[0] if usable else None
+
+
+def clear_model_cache():
+    with _model_lock:
+        _model_cache.clear()
+
+
+def _extract_text(result):
+    candidates = result.get('candidates') or []
+    if not candidates:
+        return ""
+    parts = candidates[0].get('content', {}).get('parts', [])
+    return "".join(part.get('text', '') for part in parts)
+
+
+class GeminiClient:
+    def __init__(self, api_key):
+        self.api_key = api_key
+
+    async def model(self):
+        now = time.monotonic()
+        with _model_lock:
+            cached = _model_cache.get(self.api_key)
+        if cached and cached[1] > now:
+            return cached[0]
+        model_name, ttl = None, MODEL_MISS_TTL
+        with measure("gemini_models", "Gemini") as probe:
+            try:
+                async with get_session().get(f"{GEMINI_BASE}/models", params={"key": self.api_key}, timeout=aiohttp.ClientTimeout(total=5)) as resp:
+                    body = await resp.read()
+                    add_bytes(len(body))
+                    if resp.status == 200:
+                        model_name = pick_model(json.loads(body).get('models', []))
+                        if model_name: ttl = MODEL_CACHE_TTL
+                        else: probe.fail("no_model")
+                    else:
+                        probe.fail(GeminiError(resp.status, ""))
+            except Exception as e:
+                probe.fail(e)
+        model_name = model_name or DEFAULT_MODEL
+        with _model_lock:
+            _model_cache[self.api_key] = (model_name, now + ttl)
+        return model_name
+
+    def _payload(self, prompt):
+        return {"contents": [{"parts": [{"text": prompt}]}]}
+
+    async def generate(self, prompt, model_name=None):
+        model_name = model_name or await self.model()
+        url = f"{GEMINI_BASE}/{model_name}:generateContent"
+        with measure("gemini", model_name):
+            async with get_session().post(url, params={"key": self.api_key}, json=self._payload(prompt), timeout=aiohttp.ClientTimeout(total=GENERATE_TIMEOUT)) as resp:
+                body = await resp.read()
+                add_bytes(len(body))
+                if resp.status != 200:
+                    raise GeminiError(resp.status, body.decode('utf-8', errors='replace'))
+                return _extract_text(json.loads(body)), model_name
+
+    async def stream(self, prompt, model_name=None):
+        # async generator：逐段吐出文字
+        model_name = model_name or await self.model()
+        url = f"{GEMINI_BASE}/{model_name}:streamGenerateContent"
+        with measure("gemini_stream", model_name):
+            async for text in self._stream(url, prompt):
+                yield text
+
+    async def _stream(self, url, prompt):
+        async with get_session().post(url, params={"key": self.api_key, "alt": "sse"}, json=self._payload(prompt), timeout=aiohttp.ClientTimeout(total=GENERATE_TIMEOUT)) as resp:
+            if resp.status != 200:
+                raise GeminiError(resp.status, await resp.text())
+            async for raw in resp.content:
+                add_bytes(len(raw))
+                line = raw.decode('utf-8', errors='replace').strip()
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if not data or data == "[DONE]":
+                    continue
+                try:
+                    text = _extract_text(json.loads(data))
+                except ValueError:
+                    continue
+                if text:
+                    yield text
@@ -0,0 +1,218 @@
+import asyncio
+import contextvars
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import aiohttp
+
+# ===========================
+# 📈 來源監控 (耗時 / 流量 / 則數 / 失敗原因)
+# ===========================
+# 爬蟲失敗時照舊回傳空清單，但每次呼叫都會留下一筆紀錄：
+#   with measure("rss", "經濟日報") as probe:
+#       probe.seen += 1; probe.kept += 1; probe.fail("http_403")
+# 底層 (rss_feed / requests / Gemini) 用 add_bytes() 把流量記到目前這個 probe 上。
+# 匯出成 Prometheus 文字格式或 JSON，Streamlit 側欄可開偵錯面板查看。
+METRICS_PREFIX = "tsnews"
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0)
+RECENT_EVENTS = 500
+
+_current = contextvars.ContextVar("metrics_probe", default=None)
+_failures = contextvars.ContextVar("metrics_failures", default=None)
+
+
+def classify_error(exc):
+    # 例外 → 失敗原因 (Prometheus label 用，數量要固定)
+    if isinstance(exc, asyncio.CancelledError): return "cancelled"
+    if isinstance(exc, GeneratorExit): return "closed"  # 呼叫端提早停止讀取串流
+    if isinstance(exc, (asyncio.TimeoutError, TimeoutError)): return "timeout"
+    name = type(exc).__name__
+    if "Timeout" in name: return "timeout"  # requests / playwright 的逾時例外
+    status = getattr(exc, "status", None) or getattr(getattr(exc, "response", None), "status_code", None)
+    if isinstance(status, int): return http_reason(status)
+    if isinstance(exc, (aiohttp.ClientConnectionError, OSError)): return "connection"  # requests 的例外也是 OSError
+    if isinstance(exc, (ValueError, KeyError, IndexError)): return "parse"
+    if type(exc).__module__.startswith("playwright"):
+        return "connection" if "net::" in str(exc) else "browser"
+    return "error"
+
+
+def http_reason(status):
+    if status == 429: return "http_429"
+    if status >= 500: return "http_5xx"
+    return f"http_{status}" if status in (401, 403, 404) else "http_4xx"
+
+
+class Probe:
+    def __init__(self, op, source):
+        self.op = op
+        self.source = source
+        self.bytes = 0
+        self.seen = None   # 過濾前 (含過期) 的則數
+        self.kept = None   # 新鮮度 / 標題過濾後留下的則數
+        self.via = None    # 例如 "browser" 代表走了備援路徑
+        self.reason = None
+
+    def fail(self, reason):
+        # reason 可以是字串或例外；只記第一個原因
+        if self.reason is None:
+            self.reason = reason if isinstance(reason, str) else classify_error(reason)
+
+
+def add_bytes(n):
+    probe = _current.get()
+    if probe is not None and n:
+        probe.bytes += n
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series = {}
+        self.recent = deque(maxlen=RECENT_EVENTS)
+        self.started_at = time.time()
+
+    def record(self, probe, seconds):
+        outcome = probe.reason or "ok"
+        key = (probe.op, probe.source)
+        with self._lock:
+            s = self._series.get(key)
+            if s is None:
+                s = self._series[key] = {
+                    "outcomes": {}, "seconds": 0.0, "buckets": [0] * len(LATENCY_BUCKETS),
+                    "bytes": 0, "seen": 0, "kept": 0, "via": {},
+                }
+            s["outcomes"][outcome] = s["outcomes"].get(outcome, 0) + 1
+            s["seconds"] += seconds
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound: s["buckets"][i] += 1
+            s["bytes"] += probe.bytes
+            s["seen"] += probe.seen or 0
+            s["kept"] += probe.kept or 0
+            if probe.via: s["via"][probe.via] = s["via"].get(probe.via, 0) + 1
+            self.recent.append({
+                "at": round(time.time(), 3), "op": probe.op, "source": probe.source, "outcome": outcome,
+                "seconds": round(seconds, 4), "bytes": probe.bytes, "seen": probe.seen, "kept": probe.kept, "via": probe.via,
+            })
+
+    def summary(self):
+        # 給偵錯面板用：每個 (op, source) 一列，p50/p95 取自最近的紀錄
+        with self._lock:
+            series = {k: dict(v, outcomes=dict(v["outcomes"])) for k, v in self._series.items()}
+            recent = list(self.recent)
+        rows = []
+        for (op, source), s in sorted(series.items()):
+            calls = sum(s["outcomes"].values())
+            times = sorted(e["seconds"] for e in recent if e["op"] == op and e["source"] == source)
+            failures = {k: v for k, v in s["outcomes"].items() if k != "ok"}
+            rows.append({
+                "op": op, "source": source, "calls": calls,
+                "fail_rate": round(sum(failures.values()) / calls, 3) if calls else 0.0,
+                "failures": ", ".join(f"{k}×{v}" for k, v in sorted(failures.items())),
+                "avg_s": round(s["seconds"] / calls, 3) if calls else 0.0,
+                "p50_s": round(_percentile(times, 0.5), 3), "p95_s": round(_percentile(times, 0.95), 3),
+                "kb": round(s["bytes"] / 1024, 1), "seen": s["seen"], "kept": s["kept"],
+            })
+        return rows
+
+    def to_json(self):
+        with self._lock:
+            series = [
+                dict(s, op=op, source=source, outcomes=dict(s["outcomes"]), buckets=list(s["buckets"]), via=dict(s["via"]))
+                for (op, source), s in sorted(self._series.items())
+            ]
+            recent = list(self.recent)
+        return json.dumps({"started_at": self.started_at, "buckets": LATENCY_BUCKETS, "series": series, "recent": recent}, ensure_ascii=False)
+
+    def to_prometheus(self):
+        p = METRICS_PREFIX
+        with self._lock:
+            series = sorted(self._series.items())
+        lines = [
+            f"# HELP {p}_source_requests_total Source calls by outcome (ok or failure reason).",
+            f"# TYPE {p}_source_requests_total counter",
+        ]
+        for (op, source), s in series:
+            for outcome, n in sorted(s["outcomes"].items()):
+                lines.append(f'{p}_source_requests_total{{{_labels(op, source)},outcome="{outcome}"}} {n}')
+        lines += [f"# HELP {p}_source_duration_seconds Wall time per source call.", f"# TYPE {p}_source_duration_seconds histogram"]
+        for (op, source), s in series:
+            calls = sum(s["outcomes"].values())
+            for bound, n in zip(LATENCY_BUCKETS, s["buckets"]):
+                lines.append(f'{p}_source_duration_seconds_bucket{{{_labels(op, source)},le="{bound}"}} {n}')
+            lines.append(f'{p}_source_duration_seconds_bucket{{{_labels(op, source)},le="+Inf"}} {calls}')
+            lines.append(f'{p}_source_duration_seconds_sum{{{_labels(op, source)}}} {s["seconds"]:.6f}')
+            lines.append(f'{p}_source_duration_seconds_count{{{_labels(op, source)}}} {calls}')
+        lines += [f"# HELP {p}_source_bytes_total Bytes received per source.", f"# TYPE {p}_source_bytes_total counter"]
+        for (op, source), s in series:
+            lines.append(f'{p}_source_bytes_total{{{_labels(op, source)}}} {s["bytes"]}')
+        lines += [f"# HELP {p}_source_items_total Items before (seen) and after (kept) freshness filtering.", f"# TYPE {p}_source_items_total counter"]
+        for (op, source), s in series:
+            lines.append(f'{p}_source_items_total{{{_labels(op, source)},stage="seen"}} {s["seen"]}')
+            lines.append(f'{p}_source_items_total{{{_labels(op, source)},stage="kept"}} {s["kept"]}')
+        return "\n".join(lines) + "\n"
+
+    def save(self, path):
+        # 副檔名 .json 存 JSON，其餘存 Prometheus 文字格式 (可給 node_exporter textfile collector)
+        text = self.to_json() if path.endswith(".json") else self.to_prometheus()
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+            self.recent.clear()
+            self.started_at = time.time()
+
+
+def _labels(op, source):
+    esc = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+    return f'op="{esc(op)}",source="{esc(source)}"'
+
+
+def _percentile(values, q):
+    if not values: return 0.0
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+_metrics = Metrics()
+
+
+def get_metrics():
+    return _metrics
+
+
+@contextmanager
+def measure(op, source):
+    # 同步 / 非同步程式都能用；例外照樣往外丟，只是先記下失敗原因
+    probe = Probe(op, source)
+    token = _current.set(probe)
+    t0 = time.perf_counter()
+    try:
+        yield probe
+    except BaseException as e:
+        probe.fail(e)
+        raise
+    finally:
+        try:
+            _current.reset(token)
+        except ValueError:
+            pass  # async generator 在別的 context 被收尾時
+        _metrics.record(probe, time.perf_counter() - t0)
+        failures = _failures.get()
+        if failures is not None and probe.reason is not None:
+            failures.setdefault(probe.source, probe.reason)
+
+
+@contextmanager
+def track_failures():
+    # 收集這段期間結束的 probe 失敗原因 {source: reason} (期間建立的 task 也算)
+    failures = {}
+    token = _failures.set(failures)
+    try:
+        yield failures
+    finally:
+        _failures.reset(token)
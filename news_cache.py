@@ -0,0 +1,175 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# ===========================
+# 🗄️ 新聞快取 (SQLite，重開機也留得住)
+# ===========================
+# 以 (stock_code, source) 為 key，各來源有自己的 TTL。
+# 過期但還在 CACHE_STALE_MAX_AGE 內的資料會先直接回傳 (stale-while-revalidate)，
+# 同時在背景重新抓取，下一次就拿到新資料。
+CACHE_DIR = os.environ.get("NEWS_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"))
+CACHE_PATH = os.path.join(CACHE_DIR, "news_cache.sqlite3")
+CACHE_MAX_ROWS = 20000
+CACHE_STALE_MAX_AGE = 6 * 3600
+DEFAULT_TTL = 900
+EMPTY_TTL = 60  # 空結果多半是被擋或暫時失敗，不要留太久
+SOURCE_TTL = {"鉅亨網": 300, "Yahoo": 300}
+
+
+class NewsCache:
+    def __init__(self, path=CACHE_PATH, max_rows=CACHE_MAX_ROWS):
+        self.path = path
+        self.max_rows = max_rows
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS news_cache ("
+            " stock_code TEXT NOT NULL, source TEXT NOT NULL, payload TEXT NOT NULL,"
+            " fetched_at REAL NOT NULL, accessed_at REAL NOT NULL,"
+            " PRIMARY KEY (stock_code, source))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_news_cache_accessed ON news_cache (accessed_at)")
+        self._conn.commit()
+        self._refreshing = set()
+        self._tasks = set()
+
+    def ttl(self, source, items=None):
+        if items is not None and not items:
+            return EMPTY_TTL
+        return SOURCE_TTL.get(source, DEFAULT_TTL)
+
+    def get_many(self, stock_code, sources):
+        # 回傳 {source: (items, fetched_at)}，沒有的來源不會出現在結果裡
+        marks = ",".join("?" * len(sources))
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT source, payload, fetched_at FROM news_cache WHERE stock_code = ? AND source IN ({marks})",
+                [stock_code, *sources],
+            ).fetchall()
+            if rows:
+                self._conn.execute(
+                    f"UPDATE news_cache SET accessed_at = ? WHERE stock_code = ? AND source IN ({marks})",
+                    [now, stock_code, *sources],
+                )
+                self._conn.commit()
+        return {source: (json.loads(payload), fetched_at) for source, payload, fetched_at in rows}
+
+    def put_many(self, stock_code, mapping, fetched_at=None):
+        now = time.time()
+        fetched_at = now if fetched_at is None else fetched_at
+        rows = [(stock_code, source, json.dumps(items, ensure_ascii=False), fetched_at, now) for source, items in mapping.items()]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO news_cache VALUES (?, ?, ?, ?, ?)", rows)
+            self._conn.commit()
+        self.evict()
+
+    def ages(self, stock_code, sources):
+        now = time.time()
+        return {source: now - fetched_at for source, (_, fetched_at) in self.get_many(stock_code, sources).items()}
+
+    def evict(self):
+        # 超過上限時，依最後讀取時間淘汰最舊的資料
+        with self._lock:
+            count = self._conn.execute("SELECT COUNT(*) FROM news_cache").fetchone()[0]
+            if count <= self.max_rows:
+                return
+            self._conn.execute(
+                "DELETE FROM news_cache WHERE rowid IN (SELECT rowid FROM news_cache ORDER BY accessed_at LIMIT ?)",
+                (count - self.max_rows,),
+            )
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM news_cache")
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT COUNT(*) FROM news_cache").fetchone()[0]
+        return {"rows": rows, "hits": self.hits, "stale_hits": self.stale_hits, "misses": self.misses}
+
+    async def fetch(self, stock_code, sources, fetch_fn):
+        # fetch_fn() 回傳 {source: items}，一次抓一組來源 (例如合併查詢的 Google News)
+        cached = self.get_many(stock_code, sources)
+        now = time.time()
+        if len(cached) == len(sources):
+            stale = [s for s, (items, fetched_at) in cached.items() if now - fetched_at > self.ttl(s, items)]
+            too_old = any(now - cached[s][1] > CACHE_STALE_MAX_AGE for s in stale)
+            if not too_old:
+                if stale:
+                    self.stale_hits += 1
+                    self._revalidate(stock_code, sources, fetch_fn)
+                else:
+                    self.hits += 1
+                return {s: items for s, (items, _) in cached.items()}
+        self.misses += 1
+        result = await fetch_fn()
+        self.put_many(stock_code, {s: result.get(s, []) for s in sources})
+        return {s: result.get(s, []) for s in sources}
+
+    def expiring(self, stock_code, sources, ahead=1.0):
+        # 有來源沒快取，或已經用掉 TTL 的 ahead 比例 (例如 0.8 = 快過期了)
+        cached = self.get_many(stock_code, sources)
+        now = time.time()
+        return len(cached) < len(sources) or any(
+            now - fetched_at > self.ttl(s, items) * ahead for s, (items, fetched_at) in cached.items()
+        )
+
+    async def refresh(self, stock_code, sources, fetch_fn):
+        # 不看快取直接抓，結果寫回 (背景預熱用)
+        result = await fetch_fn()
+        mapping = {s: result.get(s, []) for s in sources}
+        self.put_many(stock_code, mapping)
+        return mapping
+
+    def _revalidate(self, stock_code, sources, fetch_fn):
+        key = (stock_code, tuple(sources))
+        if key in self._refreshing:
+            return
+        self._refreshing.add(key)
+
+        async def _refresh():
+            try:
+                result = await fetch_fn()
+                self.put_many(stock_code, {s: result.get(s, []) for s in sources})
+            except Exception:
+                pass
+            finally:
+                self._refreshing.discard(key)
+
+        task = asyncio.get_running_loop().create_task(_refresh())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+
+def format_age(seconds):
+    if seconds is None: return "即時"
+    if seconds < 60: return "剛剛"
+    if seconds < 3600: return f"{int(seconds // 60)} 分鐘前"
+    if seconds < 86400: return f"{int(seconds // 3600)} 小時前"
+    return f"{int(seconds // 86400)} 天前"
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_news_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = NewsCache()
+    return _cache
@@ -0,0 +1,144 @@
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from async_runtime import add_shutdown_hook, submit
+from dedup import dedupe_news
+from llm_client import GeminiClient
+from news_cache import get_news_cache
+from rate_limit import TokenBucket
+from score_memo import get_score_memo, news_fingerprint
+from scoring import analyze_with_gemini
+from scrapers import SOURCE_NAMES, SourceUnavailable, source_groups
+
+# ===========================
+# 🔥 背景預熱 (熱門股 + 最近查過的股票)
+# ===========================
+# 在 async_runtime 的 loop 上常駐，不佔用 Streamlit 的請求。
+# 每一輪依優先順序 (最近查過的 > 成交量排名) 檢查新聞快取，快過期的來源組先重抓，
+# 有 API Key 時順便把 AI 評分算好放進備忘錄；使用者點下去時大多直接命中快取。
+# 所有外部請求 (每組來源算 1 次、Gemini 算 1 次) 共用每分鐘 PREFETCH_BUDGET 的額度。
+PREFETCH_ENABLED = os.environ.get("PREFETCH_ENABLED", "1") != "0"
+PREFETCH_TOP_N = int(os.environ.get("PREFETCH_TOP_N", "30"))
+PREFETCH_BUDGET = float(os.environ.get("PREFETCH_BUDGET", "60"))  # 每分鐘請求數
+PREFETCH_INTERVAL = 60         # 每輪之間休息的秒數
+PREFETCH_AHEAD = 0.8           # TTL 用掉 80% 就提前重抓
+PREFETCH_RECENT_MAX = 50
+PREFETCH_RECENT_TTL = 6 * 3600  # 超過這麼久沒人查就不再特別照顧
+PREFETCH_CONCURRENCY = 2
+
+
+class Prefetcher:
+    def __init__(self, index, api_key=None, top_n=PREFETCH_TOP_N, budget_per_minute=PREFETCH_BUDGET):
+        self.index = index
+        self.api_key = api_key
+        self.top_n = top_n
+        self.bucket = TokenBucket(budget_per_minute / 60.0, burst=max(1, int(budget_per_minute // 6)))
+        self.recent = OrderedDict()  # code -> 最後一次被查的時間
+        self.stats = {"rounds": 0, "tickers": 0, "groups": 0, "scored": 0, "errors": 0, "last_round": None}
+        self._lock = threading.Lock()
+        self._future = None
+        self._stopping = False
+
+    def touch(self, code):
+        # 使用者查了某檔股票：下一輪優先照顧
+        if not code: return
+        with self._lock:
+            self.recent.pop(code, None)
+            self.recent[code] = time.time()
+            while len(self.recent) > PREFETCH_RECENT_MAX:
+                self.recent.popitem(last=False)
+
+    def plan(self):
+        # 優先順序：最近查過的 (新到舊) → 成交量前 N 名
+        now = time.time()
+        with self._lock:
+            recent = [code for code, at in reversed(self.recent.items()) if now - at < PREFETCH_RECENT_TTL]
+        order = []
+        for code in recent + self.index.top_codes(self.top_n):
+            if code not in order: order.append(code)
+        return order
+
+    async def warm(self, code):
+        cache = get_news_cache()
+        for names, fetch in source_groups(code):
+            if self._stopping: return
+            if not cache.expiring(code, names, PREFETCH_AHEAD):
+                continue
+            await self.bucket.acquire()
+            try:
+                await cache.refresh(code, names, fetch)
+            except SourceUnavailable:
+                # 被擋 / 連不上：不回填空結果，其他組照常預熱
+                self.stats["errors"] += 1
+                continue
+            self.stats["groups"] += 1
+        if self.api_key:
+            await self._score(code)
+
+    async def _score(self, code):
+        cached = get_news_cache().get_many(code, SOURCE_NAMES)
+        news = dedupe_news([n for name in SOURCE_NAMES for n in cached.get(name, ([], 0))[0]])
+        if not news: return
+        model = await GeminiClient(self.api_key).model()
+        if get_score_memo().get(news_fingerprint(news, model)) is not None:
+            return
+        hit = self.index.exact(code)
+        await self.bucket.acquire()
+        await analyze_with_gemini(self.api_key, hit[1] if hit else code, news, code)
+        self.stats["scored"] += 1
+
+    async def run_round(self):
+        queue = asyncio.Queue()
+        for code in self.plan():
+            queue.put_nowait(code)
+
+        async def worker():
+            while not queue.empty() and not self._stopping:
+                code = queue.get_nowait()
+                try:
+                    await self.warm(code)
+                    self.stats["tickers"] += 1
+                except Exception:
+                    self.stats["errors"] += 1
+
+        await asyncio.gather(*[worker() for _ in range(PREFETCH_CONCURRENCY)])
+        self.stats["rounds"] += 1
+        self.stats["last_round"] = time.time()
+
+    async def _run(self):
+        while not self._stopping:
+            await self.run_round()
+            await asyncio.sleep(PREFETCH_INTERVAL)
+
+    def start(self):
+        with self._lock:
+            if self._future is None or self._future.done():
+                self._stopping = False
+                self._future = submit(self._run())
+        return self._future
+
+    async def stop(self):
+        self._stopping = True
+        if self._future is not None:
+            self._future.cancel()
+
+
+_prefetcher = None
+_prefetcher_lock = threading.Lock()
+
+
+def get_prefetcher(index, api_key=None):
+    # 第一次呼叫時建立並開始背景預熱 (PREFETCH_ENABLED=0 可關閉)
+    global _prefetcher
+    with _prefetcher_lock:
+        if _prefetcher is None:
+            _prefetcher = Prefetcher(index, api_key)
+            add_shutdown_hook(_prefetcher.stop)
+        if api_key and not _prefetcher.api_key:
+            _prefetcher.api_key = api_key
+    if PREFETCH_ENABLED:
+        _prefetcher.start()
+    return _prefetcher
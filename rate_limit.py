@@ -0,0 +1,74 @@
+import asyncio
+import threading
+import time
+from urllib.parse import urlparse
+
+# ===========================
+# 🚦 各網域的 Token Bucket 限流
+# ===========================
+# 沒設定的網域不限流 (互動模式就是這樣)；批次模式再依來源設定每秒請求數。
+# 狀態用 threading.Lock 保護、等待用 asyncio.sleep，所以不綁定特定 event loop。
+
+
+class TokenBucket:
+    def __init__(self, rate, burst=1):
+        self.rate = float(rate)
+        self.burst = max(1.0, float(burst))
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens=1):
+        # 先預扣，回傳需要等待的秒數 (可能為 0)
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= tokens
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    async def acquire(self, tokens=1):
+        wait = self.reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+
+class DomainRateLimiter:
+    def __init__(self):
+        self._buckets = {}
+        self.waited = {}
+
+    def configure(self, domain, rate, burst=1):
+        if rate is None or rate <= 0:
+            self._buckets.pop(domain, None)
+        else:
+            self._buckets[domain] = TokenBucket(rate, burst)
+
+    def clear(self):
+        self._buckets.clear()
+
+    def bucket_for(self, url_or_domain):
+        host = urlparse(url_or_domain).hostname if "://" in url_or_domain else url_or_domain
+        while host:
+            if host in self._buckets:
+                return host, self._buckets[host]
+            host = host.partition(".")[2]
+        return None, None
+
+    async def acquire(self, url_or_domain):
+        domain, bucket = self.bucket_for(url_or_domain)
+        if bucket is None:
+            return 0.0
+        wait = await bucket.acquire()
+        self.waited[domain] = self.waited.get(domain, 0.0) + wait
+        return wait
+
+
+_limiter = DomainRateLimiter()
+
+
+def get_rate_limiter():
+    return _limiter
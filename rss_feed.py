@@ -0,0 +1,111 @@
+import email.utils
+import xml.etree.ElementTree as ET
+
+import aiohttp
+
+from http_client import get_session
+from metrics import add_bytes
+
+# ===========================
+# 📡 RSS 串流解析 (不開瀏覽器)
+# ===========================
+# 邊下載邊用 XMLPullParser 解析，每解析完一個 <item> 就交給呼叫端，
+# 呼叫端拿夠了就可以停止，不必把整份 XML 讀完、建完整棵樹。
+RSS_CHUNK_SIZE = 8192
+RSS_DRAIN_LIMIT = 256 * 1024  # 提早結束時，剩餘內容小於此值就讀完丟掉，讓連線回到連線池
+
+
+def _text(elem, tag):
+    child = elem.find(tag)
+    return child.text if child is not None else None
+
+
+def parse_item(elem):
+    pub_date = None
+    pub_date_str = _text(elem, 'pubDate')
+    if pub_date_str:
+        try: pub_date = email.utils.parsedate_to_datetime(pub_date_str)
+        except Exception: pass
+    source = elem.find('source')
+    return {
+        "title": _text(elem, 'title') or "",
+        "link": _text(elem, 'link'),
+        "guid": _text(elem, 'guid'),
+        "pub_date": pub_date,
+        "description": _text(elem, 'description') or "",
+        "source_name": source.text if source is not None else None,
+        "source_url": source.get('url') if source is not None else None,
+    }
+
+
+class RssStreamParser:
+    def __init__(self):
+        self._parser = ET.XMLPullParser(events=("start", "end"))
+        self._channel = None
+
+    def feed(self, chunk):
+        self._parser.feed(chunk)
+        items = []
+        for event, elem in self._parser.read_events():
+            if event == "start":
+                if elem.tag == 'channel': self._channel = elem
+                continue
+            if elem.tag == 'item':
+                items.append(parse_item(elem))
+                # 解析完就從樹上拿掉，記憶體只跟「目前這個 item」有關
+                if self._channel is not None:
+                    self._channel.remove(elem)
+                elem.clear()
+        return items
+
+    def close(self):
+        try: self._parser.close()
+        except ET.ParseError: pass
+
+
+def parse_rss(xml_content):
+    parser = RssStreamParser()
+    if isinstance(xml_content, str): xml_content = xml_content.encode('utf-8')
+    items = parser.feed(xml_content)
+    parser.close()
+    return items
+
+
+async def stream_rss(url, headers=None, timeout=None, meta=None):
+    # async generator：逐一吐出 item；呼叫端請用 contextlib.aclosing 包起來以便提早結束
+    # meta (dict) 會填入 status / etag / last_modified；304 (條件式請求命中) 時不吐任何 item
+    session = get_session()
+    kwargs = {"headers": headers}
+    if timeout is not None:
+        kwargs["timeout"] = aiohttp.ClientTimeout(total=timeout)
+    async with session.get(url, **kwargs) as resp:
+        resp.raise_for_status()
+        if meta is not None:
+            meta.update(status=resp.status, etag=resp.headers.get("ETag"), last_modified=resp.headers.get("Last-Modified"))
+        if resp.status == 304:
+            return
+        parser = RssStreamParser()
+        finished = False
+        try:
+            async for chunk in resp.content.iter_chunked(RSS_CHUNK_SIZE):
+                add_bytes(len(chunk))
+                for item in parser.feed(chunk):
+                    yield item
+            finished = True
+            parser.close()
+        finally:
+            if not finished:
+                await _drain(resp)
+
+
+async def _drain(resp):
+    drained = 0
+    try:
+        while drained <= RSS_DRAIN_LIMIT:
+            chunk = await resp.content.read(RSS_CHUNK_SIZE)
+            if not chunk: return
+            drained += len(chunk)
+            add_bytes(len(chunk))
+    except Exception:
+        pass
+    resp.close()
@@ -0,0 +1,141 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+
+from news_cache import CACHE_DIR
+
+# ===========================
+# 🧮 AI 評分備忘錄 (依新聞內容指紋)
+# ===========================
+# 同一組新聞 (標題 + 摘要 + 來源) + 同一個模型 = 同一個指紋，直接回傳上次的分數與報告。
+# 只多了幾則新聞時 (增量模式)，把上一份報告加上新增的新聞送給 AI 更新，不必整包重送。
+MEMO_PATH = os.path.join(CACHE_DIR, "score_memo.sqlite3")
+MEMO_MAX_ROWS = 5000
+INCREMENTAL_MAX_NEW = 5        # 新增超過這個數量就整包重送
+INCREMENTAL_MIN_OVERLAP = 0.5  # 新舊新聞重疊比例太低也整包重送
+INCREMENTAL_MAX_DEPTH = 3      # 連續增量幾次後強制整包重送，避免報告越滾越偏
+
+
+def _norm(text):
+    return " ".join(unicodedata.normalize("NFKC", text or "").lower().split())
+
+
+def article_key(news):
+    raw = "\x1f".join([_norm(news.get('source')), _norm(news.get('title')), _norm(news.get('snippet'))])
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def news_fingerprint(news_list, model_name):
+    keys = sorted(article_key(news) for news in news_list)
+    return hashlib.sha256(json.dumps([model_name, keys]).encode('utf-8')).hexdigest()
+
+
+class MemoEntry:
+    def __init__(self, fingerprint, stock_key, model, score, report, article_keys, depth, created_at):
+        self.fingerprint = fingerprint
+        self.stock_key = stock_key
+        self.model = model
+        self.score = score
+        self.report = report
+        self.article_keys = article_keys
+        self.depth = depth
+        self.created_at = created_at
+
+
+class ScoreMemo:
+    def __init__(self, path=MEMO_PATH, max_rows=MEMO_MAX_ROWS):
+        self.path = path
+        self.max_rows = max_rows
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS score_memo ("
+            " fingerprint TEXT PRIMARY KEY, stock_key TEXT NOT NULL, model TEXT NOT NULL,"
+            " score INTEGER NOT NULL, report TEXT NOT NULL, article_keys TEXT NOT NULL,"
+            " depth INTEGER NOT NULL DEFAULT 0, created_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_score_memo_stock ON score_memo (stock_key, model, created_at)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS memo_stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self._conn.commit()
+
+    def _entry(self, row):
+        if row is None: return None
+        fingerprint, stock_key, model, score, report, keys, depth, created_at = row
+        return MemoEntry(fingerprint, stock_key, model, score, report, json.loads(keys), depth, created_at)
+
+    def get(self, fingerprint):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM score_memo WHERE fingerprint = ?", (fingerprint,)).fetchone()
+        return self._entry(row)
+
+    def latest(self, stock_key, model):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM score_memo WHERE stock_key = ? AND model = ? ORDER BY created_at DESC LIMIT 1",
+                (stock_key, model),
+            ).fetchone()
+        return self._entry(row)
+
+    def delta(self, previous, news_list):
+        # 適合增量更新時回傳「新增的新聞」，否則回傳 None
+        if previous is None or previous.depth >= INCREMENTAL_MAX_DEPTH:
+            return None
+        old_keys = set(previous.article_keys)
+        added = [news for news in news_list if article_key(news) not in old_keys]
+        kept = len(news_list) - len(added)
+        if not added or len(added) > INCREMENTAL_MAX_NEW:
+            return None
+        if kept / max(len(old_keys), 1) < INCREMENTAL_MIN_OVERLAP:
+            return None
+        return added
+
+    def put(self, fingerprint, stock_key, model, score, report, news_list, depth=0):
+        keys = json.dumps(sorted(article_key(news) for news in news_list))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO score_memo VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (fingerprint, stock_key, model, score, report, keys, depth, time.time()),
+            )
+            count = self._conn.execute("SELECT COUNT(*) FROM score_memo").fetchone()[0]
+            if count > self.max_rows:
+                self._conn.execute(
+                    "DELETE FROM score_memo WHERE fingerprint IN (SELECT fingerprint FROM score_memo ORDER BY created_at LIMIT ?)",
+                    (count - self.max_rows,),
+                )
+            self._conn.commit()
+
+    def count(self, name, n=1):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO memo_stats VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                (name, n),
+            )
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            rows = dict(self._conn.execute("SELECT name, value FROM memo_stats").fetchall())
+        stats = {name: rows.get(name, 0) for name in ("hit", "incremental", "miss")}
+        total = sum(stats.values())
+        stats["articles_saved"] = rows.get("articles_saved", 0)
+        stats["hit_rate"] = round(stats["hit"] / total, 3) if total else 0.0
+        return stats
+
+
+_memo = None
+_memo_lock = threading.Lock()
+
+
+def get_score_memo():
+    global _memo
+    with _memo_lock:
+        if _memo is None:
+            _memo = ScoreMemo()
+    return _memo
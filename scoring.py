@@ -0,0 +1,156 @@
+import re
+
+from lexicon import get_lexicon
+from llm_client import GeminiClient, GeminiError
+from score_memo import get_score_memo, news_fingerprint
+
+# ===========================
+# 3. AI 評分核心 (完全依賴 AI)
+# ===========================
+def build_prompt(stock_name, news_data):
+    news_text = ""
+    for i, news in enumerate(news_data):
+        safe_snippet = news.get('snippet', '')
+        if safe_snippet is None: safe_snippet = ""
+        news_text += f"{i+1}. [{news['source']}] {news['title']}\n   摘要: {safe_snippet}\n"
+
+    # 🚀 AI 裁判提示詞 (強制要求 AI 打分)
+    prompt = f"""
+    你現在是一位權威的華爾街資深分析師。請仔細閱讀以下關於「{stock_name}」的最新新聞內容（包含標題與摘要）。
+
+    任務：
+    請不要依賴簡單的關鍵字，而是要「理解」新聞的語氣、具體數據（如營收、EPS、訂單量）以及市場預期，來給出一個綜合情緒分數。
+
+    新聞列表 (只包含最近 3 天的重點新聞)：
+    {news_text}
+
+    請輸出嚴格符合以下格式的報告 (請用繁體中文)：
+    1. **SCORE: [分數]** -> 請填入 0 到 100 的整數。
+       - 0-20: 極度恐慌 / 重大利空 (如跌停、虧損擴大、掉單)
+       - 40-60: 中立 / 觀望 / 多空交戰
+       - 80-100: 極度樂觀 / 重大利多 (如漲停、獲利創新高、接到大單)
+    2. **LEVEL**: (例如：偏多、觀望、主力出貨、利多出盡)。
+    3. **SUMMARY**: 請綜合分析這些新聞的核心影響。
+    4. **ANALYSIS**: 詳細列出你看多的理由與看空的理由。
+
+    範例輸出：
+    SCORE: 78
+    LEVEL: 樂觀偏多
+    SUMMARY: ...
+    ANALYSIS: ...
+    """
+    return prompt
+
+def parse_score(content, partial=False):
+    # 串流中 (partial) 要等分數後面出現非數字才算數，避免把 "78" 截成 "7"
+    pattern = r"SCORE:\s*(\d+)(?=\D)" if partial else r"SCORE:\s*(\d+)"
+    score_match = re.search(pattern, content, re.IGNORECASE)
+    return int(score_match.group(1)) if score_match else None
+
+def build_incremental_prompt(stock_name, previous_report, added_news):
+    news_text = ""
+    for i, news in enumerate(added_news):
+        safe_snippet = news.get('snippet', '') or ""
+        news_text += f"{i+1}. [{news['source']}] {news['title']}\n   摘要: {safe_snippet}\n"
+
+    # 增量模式：只送上一份報告 + 新增的新聞
+    prompt = f"""
+    你現在是一位權威的華爾街資深分析師。以下是你稍早針對「{stock_name}」撰寫的分析報告：
+
+    {previous_report}
+
+    之後又出現了以下新聞 (只列出新增的部分)：
+    {news_text}
+
+    請綜合原本的判斷與這些新增新聞，更新你的評分與報告，並輸出與原報告完全相同的格式 (請用繁體中文)：
+    SCORE: [0 到 100 的整數]
+    LEVEL: ...
+    SUMMARY: ...
+    ANALYSIS: ...
+    """
+    return prompt
+
+def _error_text(e):
+    return str(e) if isinstance(e, GeminiError) else f"{type(e).__name__}: {e}"
+
+async def _plan(api_key, stock_name, news_data, stock_code):
+    # 決定這次要：直接用備忘錄 (hit)、送增量 (incremental) 還是整包重送 (miss)
+    client = GeminiClient(api_key)
+    model_name = await client.model()
+    memo = get_score_memo()
+    stock_key = stock_code or stock_name
+    fingerprint = news_fingerprint(news_data, model_name)
+    plan = {"client": client, "model": model_name, "memo": memo, "stock_key": stock_key, "fingerprint": fingerprint, "depth": 0}
+    hit = memo.get(fingerprint)
+    if hit is not None:
+        memo.count("hit")
+        plan["hit"] = hit
+        return plan
+    previous = memo.latest(stock_key, model_name)
+    added = memo.delta(previous, news_data)
+    if added is not None:
+        memo.count("incremental")
+        memo.count("articles_saved", len(news_data) - len(added))
+        plan["prompt"] = build_incremental_prompt(stock_name, previous.report, added)
+        plan["depth"] = previous.depth + 1
+    else:
+        memo.count("miss")
+        plan["prompt"] = build_prompt(stock_name, news_data)
+    return plan
+
+def _remember(plan, score, content, news_data):
+    if score is not None:
+        plan["memo"].put(plan["fingerprint"], plan["stock_key"], plan["model"], score, content, news_data, plan["depth"])
+
+async def analyze_with_gemini(api_key, stock_name, news_data, stock_code=None):
+    plan = await _plan(api_key, stock_name, news_data, stock_code)
+    if "hit" in plan:
+        return plan["hit"].score, plan["hit"].report, plan["model"]
+    try:
+        content, model_name = await plan["client"].generate(plan["prompt"], plan["model"])
+        # 嚴格解析 AI 的分數
+        score = parse_score(content)
+        _remember(plan, score, content, news_data)
+        return score, content, model_name
+    except Exception as e:
+        return None, _error_text(e), plan["model"]
+
+async def stream_with_gemini(api_key, stock_name, news_data, stock_code=None):
+    # async generator：逐段吐出 (目前為止的報告, 分數或 None, 模型)
+    plan = await _plan(api_key, stock_name, news_data, stock_code)
+    model_name = plan["model"]
+    if "hit" in plan:
+        yield plan["hit"].report, plan["hit"].score, model_name
+        return
+    content, score = "", None
+    async for chunk in plan["client"].stream(plan["prompt"], model_name):
+        content += chunk
+        if score is None: score = parse_score(content, partial=True)
+        yield content, score, model_name
+    if score is None:
+        score = parse_score(content)
+        yield content, score, model_name
+    _remember(plan, score, content, news_data)
+
+# 備用關鍵字算法 (只有在 AI 掛掉時才用)
+def calculate_score_keyword_fallback(news_list):
+    # 詞典與權重在 lexicon.py (可用 LEXICON_PATH 指定 JSON 檔)
+    return get_lexicon().score_news(news_list)
+
+class TransientAIError(Exception):
+    pass
+
+def is_transient_ai_error(report):
+    # 429 / 5xx / 連線逾時屬於可以重試的錯誤
+    return bool(re.match(r"Error (429|5\d\d)", report or "")) or bool(re.search(r"timed? ?out|connect", report or "", re.IGNORECASE))
+
+async def score_news(api_key, stock_name, news_list, raise_transient=False, stock_code=None):
+    # 回傳 (分數, 報告, 分數來源 "AI"/"Fallback", 使用的模型)
+    if api_key and news_list:
+        ai_score, ai_report, used_model = await analyze_with_gemini(api_key, stock_name, news_list, stock_code)
+        if ai_score is not None:
+            return ai_score, ai_report, "AI", used_model
+        if raise_transient and is_transient_ai_error(ai_report):
+            raise TransientAIError(ai_report)
+        return calculate_score_keyword_fallback(news_list), "### AI 無法生成報告，僅提供新聞摘要", "Fallback", used_model
+    return calculate_score_keyword_fallback(news_list), "", "Fallback", None
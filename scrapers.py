@@ -0,0 +1,506 @@
+import asyncio
+import math
+import os
+import random
+import re
+import time
+from contextlib import aclosing
+from datetime import datetime
+from urllib.parse import urlparse
+
+import aiohttp
+import requests
+
+from archive import archive_news
+from browser_pool import block_resources, get_browser_pool
+from delta import get_cursor
+from metrics import add_bytes, classify_error, http_reason, measure, track_failures
+from news_cache import get_news_cache
+from rate_limit import get_rate_limiter
+from rss_feed import parse_rss, stream_rss
+from yahoo_news import fetch_yahoo_news
+
+# ===========================
+# 2. 爬蟲模組 (維持 V15.6 的精兵策略)
+# ===========================
+USER_AGENTS = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36"
+]
+def get_ua(): return random.choice(USER_AGENTS)
+
+# 各來源的端點；可用環境變數指到本機替身伺服器做離線測試 (見 benchmarks/fixture_server.py)
+TRADINGVIEW_SCAN_URL = os.environ.get("TRADINGVIEW_SCAN_URL", "https://scanner.tradingview.com/taiwan/scan")
+GOOGLE_NEWS_RSS_URL = os.environ.get("GOOGLE_NEWS_RSS_URL", "https://news.google.com/rss/search")
+CNYES_NEWS_URL = os.environ.get("CNYES_NEWS_URL", "https://ess.api.cnyes.com/ess/api/v1/news/keyword")
+YAHOO_STOCK_URL = os.environ.get("YAHOO_STOCK_URL", "https://tw.stock.yahoo.com")
+
+# 增量抓取合併上次結果時的新鮮度 (與 is_within_3_days / three_days_ago_ts 相同的界線)
+RSS_MAX_AGE = 4 * 86400
+ANUE_MAX_AGE = 3 * 86400
+
+def delta_via(meta, cursor):
+    # 監控用：304 沿用上次結果 / 只處理了新的部分
+    if meta.get("status") == 304: return "not_modified"
+    return "delta" if cursor.skipped else None
+
+def is_within_3_days(date_obj):
+    if not date_obj: return True
+    now = datetime.now(date_obj.tzinfo)
+    delta = now - date_obj
+    return delta.days <= 3
+
+async def fetch_market_ranking(limit=1500):
+    # TradingView 掃描結果，依成交量由大到小：[(code, name), ...]
+    ranking = []
+    try:
+        api_url = TRADINGVIEW_SCAN_URL
+        payload = {
+            "columns": ["name", "description", "volume"],
+            "ignore_unknown_fields": False,
+            "options": {"lang": "zh_TW"},
+            "range": [0, limit],
+            "sort": {"sortBy": "volume", "sortOrder": "desc"},
+            "symbols": {"query": {"types": []}, "tickers": []},
+            "filter": [{"left": "type", "operation": "in_range", "right": ["stock", "dr", "fund"]}]
+        }
+        await get_rate_limiter().acquire(api_url)
+        resp = await asyncio.to_thread(requests.post, api_url, json=payload, timeout=5)
+        if resp.status_code == 200:
+            data = resp.json()
+            for item in data.get('data', []):
+                code = item['d'][0]
+                name = item['d'][1].replace("KY", "").strip()
+                ranking.append((code, name))
+    except Exception: pass
+    return ranking
+
+async def search_yahoo_symbol(query):
+    # 本地股票索引查不到時，才開瀏覽器去 Yahoo 搜尋
+    with measure("yahoo_search", "Yahoo") as probe:
+        try:
+            search_url = f"{YAHOO_STOCK_URL}/search?p={requests.utils.quote(query)}"
+            await get_rate_limiter().acquire(search_url)
+            async with get_browser_pool().page(user_agent=get_ua()) as page:
+                await block_resources(page)
+                await page.goto(search_url, timeout=8000)
+                link = page.locator("a[href*='/quote/']").first
+                if await link.count() > 0:
+                    text = await link.inner_text()
+                    href = await link.get_attribute("href")
+                    match = re.search(r"(\d{4,6})", href)
+                    if match:
+                        code = match.group(1)
+                        name = text.split("\n")[0].strip()
+                        if name == code or not name: name = query
+                        return code, name
+            probe.fail("not_found")
+        except Exception as e: probe.fail(e)
+    return None, None
+
+def rss_item_to_news(item, source_name):
+    # 過期或標題太短回傳 None
+    if item["pub_date"] is not None and not is_within_3_days(item["pub_date"]):
+        return None
+    desc_clean = re.sub(r'<[^>]+>', '', item["description"])
+    clean_title = item["title"].split(" - ")[0]
+    if len(clean_title) <= 4: return None
+    return {
+        "title": clean_title,
+        "snippet": desc_clean[:200],
+        "source": source_name,
+        "link": item["link"]
+    }
+
+def rss_item_record(item, source_name):
+    # 封存用：不做新鮮度過濾，舊聞也留下來
+    return {
+        "title": item["title"].split(" - ")[0],
+        "snippet": re.sub(r'<[^>]+>', '', item["description"])[:200],
+        "source": source_name,
+        "link": item["link"],
+        "guid": item["guid"],
+        "published_at": item["pub_date"].timestamp() if item["pub_date"] else None
+    }
+
+def item_published(item):
+    return item["pub_date"].timestamp() if item["pub_date"] else None
+
+def google_rss_url(query):
+    return f"{GOOGLE_NEWS_RSS_URL}?q={query}&hl=zh-TW&gl=TW&ceid=TW:zh-Hant"
+
+async def fetch_google_rss(stock_code, site_domain, source_name):
+    rss_url = google_rss_url(f"{stock_code}+site:{site_domain}")
+    parsed = []
+    with measure("google_rss", source_name) as probe:
+        probe.seen = 0
+        try:
+            await get_rate_limiter().acquire(rss_url)
+            # 主路徑：直接 HTTP 串流解析，只處理上次沒看過的，拿滿 3 則新鮮新聞就停
+            cursor = get_cursor(stock_code, source_name)
+            entries, meta = [], {}
+            async with aclosing(stream_rss(rss_url, headers={"User-Agent": get_ua(), **cursor.headers()}, meta=meta)) as items:
+                async for item in items:
+                    probe.seen += 1
+                    if not cursor.is_new(item, item_published(item)):
+                        if cursor.exhausted: break
+                        continue
+                    parsed.append(rss_item_record(item, source_name))
+                    news = rss_item_to_news(item, source_name)
+                    if news: entries.append((item_published(item), news))
+                    if len(entries) >= 3: break
+            data = cursor.commit(entries, max_age=RSS_MAX_AGE, **meta)[:3]
+            probe.via = delta_via(meta, cursor)
+            probe.kept = len(data)
+            return data
+        except Exception as e:
+            probe.via = "browser:" + classify_error(e)
+            return await fetch_google_rss_browser(rss_url, source_name, probe, parsed)
+        finally:
+            archive_news(stock_code, parsed)
+
+async def fetch_rss_via_browser(rss_url):
+    # 備援：HTTP 被擋時才用瀏覽器取 XML
+    await get_rate_limiter().acquire(rss_url)
+    async with get_browser_pool().page(user_agent=get_ua()) as page:
+        response = await page.goto(rss_url, timeout=20000, wait_until="commit")
+        body = await response.body()
+        add_bytes(len(body))
+        return parse_rss(body)
+
+async def fetch_google_rss_browser(rss_url, source_name, probe, parsed):
+    try:
+        data = []
+        for item in await fetch_rss_via_browser(rss_url):
+            probe.seen += 1
+            parsed.append(rss_item_record(item, source_name))
+            news = rss_item_to_news(item, source_name)
+            if news: data.append(news)
+            if len(data) >= 3: break
+        probe.kept = len(data)
+        return data
+    except Exception as e:
+        probe.fail(e)
+        return []
+
+async def scrape_anue(stock_code):
+    with measure("anue", "鉅亨網") as probe:
+        try:
+            current_time = int(time.time())
+            url = f"{CNYES_NEWS_URL}?q={stock_code}&limit=10&page=1"
+            headers = {
+                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+                "Referer": "https://www.cnyes.com/"
+            }
+            cursor = get_cursor(stock_code, "鉅亨網")
+            headers.update(cursor.headers())
+            await get_rate_limiter().acquire(url)
+            response = await asyncio.to_thread(requests.get, url, headers=headers, timeout=5)
+            add_bytes(len(response.content))
+            
+            if response.status_code == 304:
+                data = cursor.commit([], status=304, max_age=ANUE_MAX_AGE)
+                probe.via = "not_modified"
+                probe.kept = len(data)
+                return data[:3]
+            if response.status_code == 200:
+                data = response.json()
+                items = data.get('data', {}).get('items', [])
+                probe.seen = len(items)
+                result = []
+                entries = []
+                
+                three_days_ago_ts = current_time - (3 * 86400)
+                
+                parsed = []
+                
+                for item in items:
+                    publish_at = item.get('publishAt', 0)
+                    title = item.get('title', '')
+                    summary = item.get('summary')
+                    if summary is None: summary = ""
+                    
+                    news_id = item.get('newsId')
+                    link = f"https://news.cnyes.com/news/id/{news_id}" if news_id else None
+                    if not cursor.is_new({"link": link, "title": title, "source": "鉅亨網"}):
+                        continue
+                    parsed.append({"title": title, "snippet": summary, "source": "鉅亨網", "link": link, "published_at": publish_at or None})
+                    if publish_at < three_days_ago_ts:
+                        continue
+                    
+                    if title:
+                        result.append({
+                            "title": title,
+                            "snippet": summary,
+                            "source": "鉅亨網",
+                            "link": link
+                        })
+                        entries.append((publish_at, result[-1]))
+                
+                archive_news(stock_code, parsed)
+                result = cursor.commit(entries, etag=response.headers.get("ETag"), last_modified=response.headers.get("Last-Modified"), max_age=ANUE_MAX_AGE)
+                probe.via = delta_via({}, cursor)
+                probe.kept = len(result)
+                return result[:3]
+            probe.fail(http_reason(response.status_code))
+        except Exception as e:
+            probe.fail(e)
+    return []
+
+# Yahoo：先直接抓 HTML 解析 (lean)，解析不到才開瀏覽器 (擋掉圖片 / 字型 / CSS，等到列表出現就讀)
+YAHOO_MODE = os.environ.get("YAHOO_MODE", "lean")  # lean / browser
+YAHOO_NEWS_SELECTOR = '#main-2-QuoteNews-Proxy a[href*="/news/"]'
+YAHOO_SELECTOR_TIMEOUT = 8000
+
+async def scrape_yahoo(stock_code):
+    yahoo_url = f"{YAHOO_STOCK_URL}/quote/{stock_code}.TW/news"
+    with measure("yahoo", "Yahoo") as probe:
+        try:
+            await get_rate_limiter().acquire(yahoo_url)
+            if YAHOO_MODE == "lean":
+                try:
+                    cursor, meta = get_cursor(stock_code, "Yahoo"), {}
+                    data, found = await fetch_yahoo_news(yahoo_url, headers={"User-Agent": get_ua(), **cursor.headers()}, meta=meta)
+                    if found:
+                        # 列表沒有發布時間，200 時整份取代；304 沿用上次的結果
+                        data = cursor.commit([(None, n) for n in data], replace=True, **meta)
+                        probe.via = delta_via(meta, cursor) or "http"
+                        probe.kept = len(data)
+                        archive_news(stock_code, data)
+                        return data
+                    probe.via = "browser:no_list"
+                except aiohttp.ClientResponseError as e:
+                    if e.status == 404: raise  # 沒有這檔 (例如上櫃股)，開瀏覽器也沒用
+                    probe.via = "browser:" + classify_error(e)
+                except Exception as e:
+                    probe.via = "browser:" + classify_error(e)
+            data = await scrape_yahoo_browser(yahoo_url, probe)
+            probe.kept = len(data)
+            archive_news(stock_code, data)
+            return data
+        except Exception as e:
+            probe.fail(e)
+            return []
+
+async def scrape_yahoo_browser(yahoo_url, probe):
+    async with get_browser_pool().page(user_agent=get_ua()) as page:
+        await block_resources(page)
+        response = await page.goto(yahoo_url, timeout=20000, wait_until="domcontentloaded")
+        if response is not None:
+            if response.status >= 400: probe.fail(http_reason(response.status))
+            add_bytes(len(await response.body()))
+        try:
+            await page.wait_for_selector(YAHOO_NEWS_SELECTOR, timeout=YAHOO_SELECTOR_TIMEOUT)
+        except Exception:
+            pass  # 沒等到就照樣讀，讀不到就是空清單
+        
+        data = []
+        elements = await page.locator(YAHOO_NEWS_SELECTOR).all()
+        probe.seen = len(elements)
+        seen_titles = set()
+        
+        for el in elements[:3]: 
+            try:
+                text = await el.inner_text()
+                href = await el.get_attribute("href")
+                
+                lines = text.split('\n')
+                title = max(lines, key=len) if lines else ""
+                
+                if len(title) > 5 and title not in seen_titles:
+                    seen_titles.add(title)
+                    data.append({
+                        "title": title, 
+                        "snippet": "Yahoo 焦點新聞 (最新)", 
+                        "source": "Yahoo",
+                        "link": href
+                    })
+            except: pass
+            
+        return data
+
+# Google News 合併查詢：一次帶多個 site:，再依來源網域分流回各家媒體
+GOOGLE_NEWS_SITES = [
+    ("money.udn.com", "經濟日報"), ("ec.ltn.com.tw", "自由財經"), ("ctee.com.tw", "工商時報"),
+    ("chinatimes.com", "中時新聞"), ("ettoday.net", "ETtoday"), ("news.tvbs.com.tw", "TVBS新聞"),
+    ("businesstoday.com.tw", "今周刊"), ("wealth.com.tw", "財訊"), ("storm.mg", "風傳媒")
+]
+GOOGLE_NEWS_COMBINED = True
+GOOGLE_NEWS_CHUNK = 3  # 每個合併查詢最多帶幾個 site:，太多的話大站會把小站擠出結果
+
+def route_source(item, sites):
+    for url in (item["source_url"], item["link"]):
+        host = urlparse(url).hostname if url else None
+        if not host: continue
+        for domain, name in sites:
+            if host == domain or host.endswith("." + domain): return name
+    for domain, name in sites:
+        if item["source_name"] == name: return name
+    return None
+
+class NewsRouter:
+    def __init__(self, sites, limit=3, cursor=None):
+        self.sites = sites
+        self.limit = limit
+        self.cursor = cursor  # 有游標時只處理沒看過的新聞，最後再併入上次的結果
+        self.result = {name: [] for _, name in sites}
+        self.parsed = []  # 分流得到的所有新聞 (含舊聞)，給封存用
+        self.entries = []
+
+    def add(self, item):
+        # 回傳 True 代表每個來源都已經收滿 (或連續遇到太多看過的)
+        name = route_source(item, self.sites)
+        if name is not None:
+            if self.cursor is not None and not self.cursor.is_new(item, item_published(item)):
+                return self.cursor.exhausted
+            self.parsed.append(rss_item_record(item, name))
+            news = rss_item_to_news(item, name)
+            if news:
+                # 收滿之後的也記進游標當備位 (已標成看過)，前面的過期時由它們遞補
+                self.entries.append((item_published(item), news))
+                if len(self.result[name]) < self.limit: self.result[name].append(news)
+        return all(len(v) >= self.limit for v in self.result.values())
+
+    def merge(self, meta):
+        # 新的在前、上次的在後，重新依來源分流
+        result = {name: [] for _, name in self.sites}
+        for news in self.cursor.commit(self.entries, max_age=RSS_MAX_AGE, **meta):
+            bucket = result.get(news["source"])
+            if bucket is not None and len(bucket) < self.limit: bucket.append(news)
+        self.result = result
+        return result
+
+async def fetch_google_rss_multi(stock_code, sites):
+    sites_query = "+OR+".join(f"site:{domain}" for domain, _ in sites)
+    rss_url = google_rss_url(f"{stock_code}+({sites_query})")
+    label = "/".join(name for _, name in sites)
+    router = NewsRouter(sites, cursor=get_cursor(stock_code, label))
+    # 合併查詢的耗時無法拆給各家，以整組記錄
+    with measure("google_rss", label) as probe:
+        probe.seen = 0
+        try:
+            await get_rate_limiter().acquire(rss_url)
+            meta = {}
+            async with aclosing(stream_rss(rss_url, headers={"User-Agent": get_ua(), **router.cursor.headers()}, meta=meta)) as items:
+                async for item in items:
+                    probe.seen += 1
+                    if router.add(item): break
+            router.merge(meta)
+            probe.via = delta_via(meta, router.cursor)
+            probe.kept = sum(len(v) for v in router.result.values())
+            archive_news(stock_code, router.parsed)
+            return router.result
+        except Exception as e:
+            probe.via = "browser:" + classify_error(e)
+            archive_news(stock_code, router.parsed)
+            router = NewsRouter(sites)
+        try:
+            for item in await fetch_rss_via_browser(rss_url):
+                probe.seen += 1
+                if router.add(item): break
+        except Exception as e: probe.fail(e)
+        probe.kept = sum(len(v) for v in router.result.values())
+        archive_news(stock_code, router.parsed)
+    return router.result
+
+def google_news_chunks():
+    return [GOOGLE_NEWS_SITES[i:i + GOOGLE_NEWS_CHUNK] for i in range(0, len(GOOGLE_NEWS_SITES), GOOGLE_NEWS_CHUNK)]
+
+async def scrape_udn(c): return await fetch_google_rss(c, "money.udn.com", "經濟日報")
+async def scrape_ltn(c): return await fetch_google_rss(c, "ec.ltn.com.tw", "自由財經")
+async def scrape_ctee(c): return await fetch_google_rss(c, "ctee.com.tw", "工商時報")
+async def scrape_chinatimes(c): return await fetch_google_rss(c, "chinatimes.com", "中時新聞")
+async def scrape_ettoday(c): return await fetch_google_rss(c, "ettoday.net", "ETtoday")
+async def scrape_tvbs(c): return await fetch_google_rss(c, "news.tvbs.com.tw", "TVBS新聞")
+async def scrape_businesstoday(c): return await fetch_google_rss(c, "businesstoday.com.tw", "今周刊")
+async def scrape_wealth(c): return await fetch_google_rss(c, "wealth.com.tw", "財訊")
+async def scrape_storm(c): return await fetch_google_rss(c, "storm.mg", "風傳媒")
+
+SOURCE_NAMES = ["鉅亨網", "Yahoo"] + [name for _, name in GOOGLE_NEWS_SITES]
+
+NOT_FOUND_REASONS = ("http_404", "not_found")  # 確定沒有資料，不算失敗
+
+class SourceUnavailable(Exception):
+    # 爬蟲失敗時照舊回傳空清單；整組都是空的又有失敗紀錄 (被擋 / 逾時 / 連線錯誤) 時改丟這個，
+    # 狀態記成 error，空結果也不會寫進快取
+    pass
+
+async def fetch_checked(fetch):
+    with track_failures() as failures:
+        part = await fetch()
+    reasons = sorted({r for r in failures.values() if r not in NOT_FOUND_REASONS})
+    if reasons and not any(part.values()):
+        raise SourceUnavailable(", ".join(reasons))
+    return part
+
+def source_groups(stock_code):
+    # 每組 = (涵蓋的來源, 一次抓回整組 {source: items} 的函式)；快取也以組為單位回填
+    # 函式都經過 fetch_checked：整組失敗時丟 SourceUnavailable，呼叫端 (快取 / 預熱) 不會把空結果存起來
+    async def one(name, scraper): return {name: await scraper(stock_code)}
+    groups = [(["鉅亨網"], lambda: one("鉅亨網", scrape_anue)), (["Yahoo"], lambda: one("Yahoo", scrape_yahoo))]
+    if GOOGLE_NEWS_COMBINED:
+        for chunk in google_news_chunks():
+            groups.append(([name for _, name in chunk], lambda chunk=chunk: fetch_google_rss_multi(stock_code, chunk)))
+    else:
+        for domain, name in GOOGLE_NEWS_SITES:
+            groups.append(([name], lambda d=domain, n=name: one(n, lambda c: fetch_google_rss(c, d, n))))
+    return [(names, lambda fetch=fetch: fetch_checked(fetch)) for names, fetch in groups]
+
+# 漸進式收集：哪個來源先回來就先交出去，不再等最慢的那個
+# - 每組來源各自有逾時 (SOURCE_TIMEOUT)，整體還有 GATHER_DEADLINE 的總預算
+# - 回來的來源數達到 quorum 後，剩下的最多再等 QUORUM_GRACE 秒，之後一律取消
+GATHER_DEADLINE = float(os.environ.get("GATHER_DEADLINE", "15"))
+GATHER_QUORUM = float(os.environ.get("GATHER_QUORUM", "0.8"))  # 來源比例
+QUORUM_GRACE = float(os.environ.get("QUORUM_GRACE", "1.5"))
+DEFAULT_SOURCE_TIMEOUT = 8.0
+SOURCE_TIMEOUT = {"Yahoo": 12.0}
+
+async def stream_news(stock_code, use_cache=True, deadline=GATHER_DEADLINE, quorum=GATHER_QUORUM, grace=QUORUM_GRACE):
+    # async generator：依完成順序吐出 (來源, 新聞, 狀態, 開始後秒數)
+    # 狀態：ok / timeout (單一來源逾時) / error (被擋或連線失敗，空清單) / cancelled (超過總預算或 quorum 寬限被取消)
+    cache = get_news_cache() if use_cache else None
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+
+    async def fetch_group(names, fetch):
+        timeout = max(SOURCE_TIMEOUT.get(name, DEFAULT_SOURCE_TIMEOUT) for name in names)
+        work = fetch() if cache is None else cache.fetch(stock_code, names, fetch)
+        return await asyncio.wait_for(work, timeout)
+
+    tasks = {asyncio.ensure_future(fetch_group(names, fetch)): names for names, fetch in source_groups(stock_code)}
+    needed = math.ceil(sum(len(names) for names in tasks.values()) * quorum)
+    end = started + deadline
+    returned = 0
+    pending = set(tasks)
+    try:
+        while pending:
+            remaining = end - loop.time()
+            if remaining <= 0: break
+            done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                try:
+                    part, status = task.result(), "ok"
+                except asyncio.TimeoutError:
+                    part, status = {}, "timeout"
+                except Exception:
+                    part, status = {}, "error"
+                elapsed = loop.time() - started
+                for name in tasks[task]:
+                    yield name, part.get(name, []), status, elapsed
+                returned += len(tasks[task])
+            if pending and returned >= needed:
+                end = min(end, loop.time() + grace)
+    finally:
+        for task in pending: task.cancel()
+    elapsed = loop.time() - started
+    for task in pending:
+        for name in tasks[task]:
+            yield name, [], "cancelled", elapsed
+
+async def run_analysis(stock_code, use_cache=True, deadline=GATHER_DEADLINE, quorum=1.0):
+    # 一次拿齊 (批次模式用)：預設等所有來源，但仍受總預算與各來源逾時限制
+    merged = {}
+    async with aclosing(stream_news(stock_code, use_cache, deadline, quorum)) as stream:
+        async for name, items, _, _ in stream:
+            merged[name] = items
+    return [merged.get(name, []) for name in SOURCE_NAMES]
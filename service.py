@@ -0,0 +1,209 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+from contextlib import aclosing
+
+from aiohttp import web
+
+import bootstrap
+from async_runtime import add_shutdown_hook, run_sync, shutdown
+from dedup import dedupe_news
+from metrics import get_metrics
+from news_cache import get_news_cache
+from prefetch import get_prefetcher
+from scoring import score_news
+from scrapers import SOURCE_NAMES, stream_news
+from stock_index import get_stock_index, resolve_stock_info
+from timeseries import get_score_series
+
+# ===========================
+# 🛰️ 分析服務 (HTTP API)
+# ===========================
+# Streamlit 每個使用者各跑一次爬蟲 + AI，十個人同時看 2330 就是十次同樣的工作。
+# 這裡把爬蟲與評分包成常駐服務，同一個 key 正在算的請求直接共用結果 (single-flight)，
+# 負載只跟「不同的股票數」有關，跟使用者人數無關。app.py 設了 ANALYSIS_SERVICE_URL 就只當前端。
+#   python service.py --port 8700
+#   GET /resolve?q=台積電         -> {"code", "name"}
+#   GET /news/{code}              -> 各來源新聞 + 去重後的清單
+#   GET /analyze/{code}?name=...  -> 新聞 + 分數 + 報告 (標頭 X-Gemini-Key 可帶使用者自己的金鑰)
+#   GET /metrics                  -> Prometheus 文字格式
+#   GET /healthz                  -> 狀態 (ai = 服務端有沒有設定系統金鑰)
+# 服務跑在 async_runtime 的 loop 上，和爬蟲共用連線池與瀏覽器。
+SERVICE_HOST = os.environ.get("ANALYSIS_SERVICE_HOST", "127.0.0.1")
+SERVICE_PORT = int(os.environ.get("ANALYSIS_SERVICE_PORT", "8700"))
+STOCK_CODE_RE = re.compile(r"^[0-9A-Za-z]{4,7}$")
+
+
+class SingleFlight:
+    # 同一個 key 同時只跑一份；後到的呼叫端等同一個結果 (包含例外)
+    def __init__(self):
+        self._calls = {}
+        self.started = 0
+        self.shared = 0
+
+    def __len__(self):
+        return len(self._calls)
+
+    async def do(self, key, fn):
+        task = self._calls.get(key)
+        if task is None:
+            self.started += 1
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        else:
+            self.shared += 1
+        # shield：某個呼叫端斷線被取消時，其他人 (和快取回填) 照樣拿得到結果
+        return await asyncio.shield(task)
+
+    def _done(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()  # 沒人等的時候也不要噴 "exception was never retrieved"
+
+
+def _key_id(api_key):
+    # single-flight 的 key 不直接放金鑰
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16] if api_key else None
+
+
+class AnalysisService:
+    def __init__(self, index, api_key=None, prefetcher=None):
+        self.index = index
+        self.api_key = api_key
+        self.prefetcher = prefetcher
+        self.flight = SingleFlight()
+        self.started_at = time.time()
+
+    async def resolve(self, query):
+        query = query.strip()
+        return await self.flight.do(("resolve", query.upper()), lambda: resolve_stock_info(query, self.index))
+
+    async def news(self, code):
+        return await self.flight.do(("news", code), lambda: self._news(code))
+
+    async def _news(self, code):
+        sources = {}
+        async with aclosing(stream_news(code)) as stream:
+            async for name, items, state, elapsed in stream:
+                sources[name] = {"items": items, "status": state, "elapsed": round(elapsed, 3)}
+        ages = get_news_cache().ages(code, SOURCE_NAMES)
+        for name, source in sources.items():
+            source["age"] = ages.get(name)
+        news = dedupe_news([n for name in SOURCE_NAMES for n in sources.get(name, {}).get("items", [])])
+        return {"code": code, "sources": sources, "news": news, "fetched_at": time.time()}
+
+    async def analyze(self, code, name=None, api_key=None):
+        api_key = api_key or self.api_key
+        if name is None:
+            hit = self.index.exact(code)
+            name = hit[1] if hit else code
+        if self.prefetcher is not None:
+            self.prefetcher.touch(code)
+        return await self.flight.do(("analyze", code, _key_id(api_key)), lambda: self._analyze(code, name, api_key))
+
+    async def _analyze(self, code, name, api_key):
+        result = dict(await self.news(code))
+        news = result["news"]
+        score, report, score_source, model = await score_news(api_key, name, news, stock_code=code)
+        if news:
+            get_score_series().record(code, score, score_source, len(news))
+        # ai：有沒有金鑰可用；False 時 Fallback 是正常結果，不是 AI 失敗
+        result.update(name=name, score=score, report=report, score_source=score_source, model=model, ai=bool(api_key))
+        return result
+
+    # ---------- HTTP ----------
+    async def handle_resolve(self, request):
+        query = request.query.get("q", "")
+        if not query.strip():
+            return _json({"error": "missing q"}, status=400)
+        code, name = await self.resolve(query)
+        if not code:
+            return _json({"error": "not_found", "query": query}, status=404)
+        return _json({"code": code, "name": name})
+
+    async def handle_news(self, request):
+        code = request.match_info["code"]
+        if not STOCK_CODE_RE.match(code):
+            return _json({"error": "invalid code"}, status=400)
+        return _json(await self.news(code))
+
+    async def handle_analyze(self, request):
+        code = request.match_info["code"]
+        if not STOCK_CODE_RE.match(code):
+            return _json({"error": "invalid code"}, status=400)
+        return _json(await self.analyze(code, request.query.get("name") or None, request.headers.get("X-Gemini-Key") or None))
+
+    async def handle_metrics(self, request):
+        p = "tsnews"
+        lines = [
+            f"# HELP {p}_singleflight_total Service calls that started work vs. joined an in-flight call.",
+            f"# TYPE {p}_singleflight_total counter",
+            f'{p}_singleflight_total{{kind="started"}} {self.flight.started}',
+            f'{p}_singleflight_total{{kind="shared"}} {self.flight.shared}',
+        ]
+        return web.Response(text=get_metrics().to_prometheus() + "\n".join(lines) + "\n", content_type="text/plain")
+
+    async def handle_health(self, request):
+        return _json({"ok": True, "ai": bool(self.api_key), "uptime": round(time.time() - self.started_at, 1), "in_flight": len(self.flight),
+                      "started": self.flight.started, "shared": self.flight.shared, "stocks": len(self.index)})
+
+    def app(self):
+        app = web.Application()
+        app.router.add_get("/resolve", self.handle_resolve)
+        app.router.add_get("/news/{code}", self.handle_news)
+        app.router.add_get("/analyze/{code}", self.handle_analyze)
+        app.router.add_get("/metrics", self.handle_metrics)
+        app.router.add_get("/healthz", self.handle_health)
+        return app
+
+
+def _json(data, status=200):
+    return web.json_response(data, status=status, dumps=lambda d: json.dumps(d, ensure_ascii=False))
+
+
+async def start_service(service, host=SERVICE_HOST, port=SERVICE_PORT):
+    # 必須在 async_runtime 的 loop 上呼叫 (run_sync)
+    runner = web.AppRunner(service.app())
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    add_shutdown_hook(runner.cleanup)
+    return site._server.sockets[0].getsockname()[1]
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="台股新聞分析服務")
+    parser.add_argument("--host", default=SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=SERVICE_PORT, help="0 代表隨機挑一個空的 port")
+    parser.add_argument("--api-key", default=os.environ.get("GEMINI_API_KEY"), help="系統 Gemini API Key (預設讀 GEMINI_API_KEY)")
+    parser.add_argument("--no-prefetch", action="store_true", help="不在背景預熱熱門股")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    bootstrap.prepare_in_background()
+    index = get_stock_index()
+    prefetcher = None if args.no_prefetch else get_prefetcher(index, args.api_key)
+    service = AnalysisService(index, args.api_key, prefetcher)
+    port = run_sync(start_service(service, args.host, args.port))
+    print(json.dumps({"ready": True, "base_url": f"http://{args.host}:{port}"}), flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
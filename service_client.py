@@ -0,0 +1,81 @@
+import asyncio
+import json
+import os
+import threading
+
+import aiohttp
+
+from http_client import get_session
+
+# ===========================
+# 🛰️ 分析服務客戶端 (app.py 的精簡模式)
+# ===========================
+# 設了 ANALYSIS_SERVICE_URL，Streamlit 只負責畫面：解析股票、抓新聞、評分都交給 service.py，
+# 多個使用者查同一檔股票時由服務端合併成一次計算。
+ANALYSIS_SERVICE_URL = os.environ.get("ANALYSIS_SERVICE_URL", "").rstrip("/")
+SERVICE_TIMEOUT = 90  # 涵蓋整輪爬蟲 (GATHER_DEADLINE) 加上 Gemini 產生報告
+
+
+class ServiceError(Exception):
+    def __init__(self, status, message):
+        super().__init__(f"Error {status}: {message}")
+        self.status = status
+
+
+# 服務連不上 / 逾時 / 回錯誤時會丟的例外，呼叫端據此改走本機或顯示錯誤
+SERVICE_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError, ServiceError)
+
+
+class AnalysisServiceClient:
+    def __init__(self, base_url):
+        self.base_url = base_url
+
+    async def _get(self, path, params=None, headers=None):
+        async with get_session().get(f"{self.base_url}{path}", params=params, headers=headers,
+                                     timeout=aiohttp.ClientTimeout(total=SERVICE_TIMEOUT)) as resp:
+            if resp.status == 404:
+                return None
+            # 先看狀態碼再解析：中間的 proxy 回 502 時內容通常不是 JSON
+            body = await resp.text()
+            try:
+                data = json.loads(body)
+            except ValueError:
+                data = None
+            if resp.status != 200:
+                raise ServiceError(resp.status, data.get("error", "") if isinstance(data, dict) else body[:200])
+            if not isinstance(data, dict):
+                raise ServiceError(resp.status, "invalid JSON response")
+            return data
+
+    async def resolve(self, query):
+        # 與 resolve_stock_info 相同：找不到回傳 (None, None)
+        data = await self._get("/resolve", {"q": query})
+        return (data["code"], data["name"]) if data else (None, None)
+
+    async def news(self, code):
+        return await self._get(f"/news/{code}")
+
+    async def health(self):
+        # {"ok", "ai" (服務端有沒有系統金鑰), ...}
+        return await self._get("/healthz")
+
+    async def analyze(self, code, name=None, api_key=None):
+        # api_key 是使用者自己輸入的金鑰才需要帶；系統金鑰由服務端設定
+        params = {"name": name} if name else None
+        headers = {"X-Gemini-Key": api_key} if api_key else None
+        return await self._get(f"/analyze/{code}", params, headers)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_service_client():
+    # 沒設定 ANALYSIS_SERVICE_URL 時回傳 None (app.py 自己跑爬蟲與評分)
+    global _client
+    if not ANALYSIS_SERVICE_URL:
+        return None
+    with _client_lock:
+        if _client is None:
+            _client = AnalysisServiceClient(ANALYSIS_SERVICE_URL)
+    return _client
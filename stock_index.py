@@ -0,0 +1,232 @@
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+
+from async_runtime import submit
+from metrics import measure
+from news_cache import CACHE_DIR
+from scrapers import fetch_market_ranking, search_yahoo_symbol
+
+# ===========================
+# 1. 股票資料庫
+# ===========================
+BASE_STOCKS = {
+    "台積電": "2330", "聯電": "2303", "鴻海": "2317", "聯發科": "2454", "長榮": "2603",
+    "陽明": "2609", "萬海": "2615", "中鋼": "2002", "中鴻": "2014", "台塑": "1301",
+    "南亞": "1303", "台化": "1326", "台塑化": "6505", "國泰金": "2882", "富邦金": "2881",
+    "中信金": "2891", "玉山金": "2884", "元大金": "2885", "兆豐金": "2886", "台泥": "1101",
+    "緯創": "3231", "廣達": "2382", "英業達": "2356", "仁寶": "2324", "和碩": "4938",
+    "技嘉": "2376", "微星": "2377", "華碩": "2357", "宏碁": "2353", "光寶科": "2301",
+    "群創": "3481", "友達": "2409", "彩晶": "6116", "聯詠": "3034", "瑞昱": "2379",
+    "台達電": "2308", "日月光": "3711", "力積電": "6770", "世界": "5347", "元太": "8069",
+    "智原": "3035", "創意": "3443", "世芯": "3661", "愛普": "6531", "祥碩": "5269",
+    "長榮航": "2618", "華航": "2610", "高鐵": "2633", "裕隆": "2201", "和泰車": "2207",
+    "統一超": "2912", "全家": "5903", "中華電": "2412", "台灣大": "3045", "遠傳": "4904",
+    "開發金": "2883", "新光金": "2888", "永豐金": "2890", "台新金": "2887", "合庫金": "5880",
+    "第一金": "2892", "華南金": "2880", "彰銀": "2801", "臺企銀": "2834", "上海商銀": "5876",
+    "元大台灣50": "0050", "元大高股息": "0056", "國泰永續高股息": "00878", "復華台灣科技優息": "00929",
+    "群益台灣精選高息": "00919", "元大美債20年": "00679B", "統一台灣高息動能": "00939", "元大台灣價值高息": "00940",
+    "力積電": "6770"
+}
+
+# ===========================
+# 🔎 股票索引 (代號 / 名稱 / 部分名稱)
+# ===========================
+# - 代號、名稱完全比對：dict，O(1)
+# - 部分名稱：單字 + 雙字 n-gram 倒排索引，取交集後再確認子字串，O(k)
+# - 都不中時給出依 n-gram 相似度排序的候選清單
+# - 以前從 Yahoo 查到的結果也存起來，同一個查詢不會再開瀏覽器
+# 開站時先讀磁碟上的快照 (沒有就用 BASE_STOCKS)，市場清單在背景更新。
+STOCK_INDEX_PATH = os.path.join(CACHE_DIR, "stock_index.json")
+STOCK_INDEX_MAX_AGE = 12 * 3600
+STOCK_INDEX_RETRY_AFTER = 300  # 排行抓不到時，隔這麼久才再試 (Streamlit 每次重畫都會問 is_stale)
+
+
+def _grams(text):
+    grams = set(text)
+    grams.update(text[i:i + 2] for i in range(len(text) - 1))
+    return grams
+
+
+class StockIndex:
+    def __init__(self, ranking=(), extra=None, yahoo=None, updated_at=0.0, failed_at=0.0):
+        self.updated_at = updated_at
+        self.failed_at = failed_at
+        self.yahoo = dict(yahoo or {})
+        self._refreshing = False
+        self._lock = threading.Lock()
+        self._build(list(ranking), dict(BASE_STOCKS if extra is None else extra))
+
+    def _build(self, ranking, extra):
+        by_code, by_name, display, order, position, postings = {}, {}, {}, {}, {}, defaultdict(set)
+        # BASE_STOCKS 先放，名稱以手動維護的為準；排序則依成交量，沒有成交量時依加入順序
+        entries = list(extra.items()) + [(name, code) for code, name in ranking] + [(name, code) for code, name in self.yahoo.values()]
+        for name, code in entries:
+            key = name.upper()
+            if key in by_name: continue
+            by_name[key] = code
+            display[key] = name
+            position[key] = len(position)
+            by_code.setdefault(code, name)
+            for gram in _grams(key):
+                postings[gram].add(key)
+        for rank, (code, _) in enumerate(ranking):
+            order.setdefault(code, rank)
+        # 一次換掉整組資料，讀取端不需要加鎖
+        self._data = (by_code, by_name, display, order, position, dict(postings))
+        self.ranking = ranking
+        self.extra = extra
+
+    def __len__(self):
+        return len(self._data[0])
+
+    def rank(self, code):
+        order = self._data[3]
+        return order.get(code, len(order))
+
+    def top_codes(self, n):
+        return [code for code, _ in self.ranking[:n]]
+
+    def exact(self, query):
+        by_code, by_name, display, _, _, _ = self._data
+        if query in by_name: return by_name[query], display[query]
+        if query in by_code: return query, by_code[query]
+        return None
+
+    def search(self, query, limit=5):
+        # 子字串比對，依 (是否為開頭、成交量排名、名稱長度) 排序；
+        # 還沒有成交量排名 (冷啟動 / 排行抓不到) 時不看長度，照 BASE_STOCKS 手動維護的順序
+        _, by_name, display, order, position, postings = self._data
+        grams = [query[i:i + 2] for i in range(len(query) - 1)] or [query]
+        sets = [postings.get(g) for g in grams]
+        if not sets or any(s is None for s in sets):
+            return []
+        keys = set.intersection(*sorted(sets, key=len))
+        hits = [key for key in keys if query in key]
+        hits.sort(key=lambda key: (not key.startswith(query), self.rank(by_name[key]), len(key) if order else 0, position[key]))
+        return [(by_name[key], display[key]) for key in hits[:limit]]
+
+    def suggest(self, query, limit=5):
+        # 模糊候選：n-gram Dice 相似度
+        _, by_name, display, _, position, postings = self._data
+        query_grams = _grams(query)
+        overlap = defaultdict(int)
+        for gram in query_grams:
+            for key in postings.get(gram, ()):
+                overlap[key] += 1
+        scored = []
+        for key, common in overlap.items():
+            score = 2 * common / (len(query_grams) + len(_grams(key)))
+            scored.append((-score, self.rank(by_name[key]), position[key], key))
+        scored.sort()
+        return [(by_name[key], display[key], round(-neg, 3)) for neg, _, _, key in scored[:limit]]
+
+    def resolve_local(self, user_input):
+        query = user_input.strip().upper()
+        if not query: return None
+        hit = self.exact(query)
+        if hit: return hit
+        hits = self.search(query, limit=1)
+        if hits: return hits[0]
+        if query in self.yahoo: return tuple(self.yahoo[query])
+        return None
+
+    def remember_yahoo(self, query, code, name):
+        self.yahoo[query.strip().upper()] = (code, name)
+        self._build(self.ranking, self.extra)
+        self.save()
+
+    # ---------- 快照 ----------
+    def to_snapshot(self):
+        return {"updated_at": self.updated_at, "failed_at": self.failed_at, "ranking": self.ranking, "extra": self.extra, "yahoo": self.yahoo}
+
+    @classmethod
+    def from_snapshot(cls, data):
+        return cls(
+            ranking=[tuple(item) for item in data.get("ranking", [])],
+            extra=data.get("extra"),
+            yahoo={q: tuple(v) for q, v in data.get("yahoo", {}).items()},
+            updated_at=data.get("updated_at", 0.0),
+            failed_at=data.get("failed_at", 0.0),
+        )
+
+    @classmethod
+    def load(cls, path=STOCK_INDEX_PATH):
+        try:
+            with open(path, encoding="utf-8") as f:
+                return cls.from_snapshot(json.load(f))
+        except (OSError, ValueError):
+            return cls()
+
+    def save(self, path=STOCK_INDEX_PATH):
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.to_snapshot(), f, ensure_ascii=False)
+            os.replace(tmp, path)
+        except OSError:
+            pass
+
+    # ---------- 更新 ----------
+    def is_stale(self):
+        now = time.time()
+        return now - self.updated_at > STOCK_INDEX_MAX_AGE and now - self.failed_at > STOCK_INDEX_RETRY_AFTER
+
+    async def refresh(self):
+        ranking = await fetch_market_ranking()
+        if not ranking:
+            # 記下失敗時間，STOCK_INDEX_RETRY_AFTER 內不再重打 (快照也記，其他程序一樣等)
+            self.failed_at = time.time()
+            self.save()
+            return False
+        self.updated_at = time.time()
+        self._build(ranking, self.extra)
+        self.save()
+        return True
+
+    def refresh_in_background(self, force=False):
+        with self._lock:
+            if self._refreshing or not (force or self.is_stale()):
+                return None
+            self._refreshing = True
+
+        async def _run():
+            try:
+                return await self.refresh()
+            finally:
+                self._refreshing = False
+
+        return submit(_run())
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_stock_index():
+    # 第一次呼叫只讀磁碟快照，快照過期才在背景跟 TradingView 同步
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = StockIndex.load()
+    _index.refresh_in_background()
+    return _index
+
+
+async def resolve_stock_info(user_input, index=None):
+    index = index or get_stock_index()
+    with measure("resolve", "index") as probe:
+        hit = index.resolve_local(user_input)
+        if not hit: probe.fail("not_found")
+    if hit: return hit
+    clean_input = user_input.strip().upper()
+    with measure("resolve", "yahoo") as probe:
+        code, name = await search_yahoo_symbol(clean_input)
+        if code:
+            index.remember_yahoo(clean_input, code, name)
+        else:
+            probe.fail("not_found")
+    return code, name
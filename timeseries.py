@@ -0,0 +1,264 @@
+import json
+import os
+import threading
+from datetime import date
+
+import numpy as np
+
+from news_cache import CACHE_DIR
+
+try:
+    import fcntl  # 批次與 Streamlit 可能同時寫入，擴充檔案時用檔案鎖
+except ImportError:  # Windows
+    fcntl = None
+
+# ===========================
+# 📊 每日情緒時間序列 (欄式儲存，memmap)
+# ===========================
+# 每個欄位一個檔案，形狀 (天數, 股票數)，row = 日期、column = 股票代號：
+#   score.f32   分數 (NaN = 當天沒有評分)
+#   count.u16   新聞則數
+#   source.u8   評分來源 (0 = 無、1 = AI、2 = 備用關鍵字)
+# 一整天的全市場橫切面是連續記憶體，排行 / 均線 / z 分數都是整欄運算，不必重算分數。
+# 天數每次多配 SERIES_DAY_CHUNK 天，股票欄位預留到 SERIES_CODE_CHUNK 的倍數；
+# 超過時整組檔案重寫 (一年 2000 檔約 5 MB，很少發生)。meta.json 記代號順序與起始日。
+SERIES_DIR = os.environ.get("SCORE_SERIES_DIR", os.path.join(CACHE_DIR, "score_series"))
+SERIES_DAY_CHUNK = 32
+SERIES_CODE_CHUNK = 512
+ROLLING_WINDOW = 20       # 均線 / z 分數的回看天數
+PREVIOUS_LOOKBACK = 7     # 「較前次」最多往回找幾天 (跨週末、假日)
+SOURCE_CODES = {"AI": 1, "Fallback": 2}
+SOURCE_LABELS = {0: "", 1: "AI", 2: "Fallback"}
+COLUMNS = {"score": (np.float32, np.nan), "count": (np.uint16, 0), "source": (np.uint8, 0)}
+
+
+def day_number(day=None):
+    # date / "YYYY-MM-DD" / None (今天) -> 序數
+    if day is None: return date.today().toordinal()
+    if isinstance(day, str): return date.fromisoformat(day).toordinal()
+    if isinstance(day, date): return day.toordinal()
+    return int(day)
+
+
+class ScoreSeries:
+    def __init__(self, root=SERIES_DIR):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._meta_mtime = None
+        self.codes, self.start_day, self.days, self.capacity = [], None, 0, 0
+        self._col = {}
+        self.arrays = {}
+        self._reload()
+
+    def _path(self, name):
+        return os.path.join(self.root, name)
+
+    def _file(self, column):
+        dtype = COLUMNS[column][0]
+        return self._path(f"{column}.{np.dtype(dtype).str[1:]}")
+
+    # ---------- 檔案 ----------
+    def _reload(self):
+        # 別的程序擴充過檔案 (meta.json 變了) 就重新 map
+        try:
+            mtime = os.stat(self._path("meta.json")).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime == self._meta_mtime:
+            return
+        with open(self._path("meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        self.codes, self.start_day = meta["codes"], meta["start_day"]
+        self.days, self.capacity = meta["days"], meta["capacity"]
+        self._col = {code: i for i, code in enumerate(self.codes)}
+        self.arrays = {
+            column: np.memmap(self._file(column), dtype=dtype, mode="r+", shape=(self.days, self.capacity))
+            for column, (dtype, _) in COLUMNS.items()
+        }
+        self._meta_mtime = mtime
+
+    def _resize(self, start_day, days, capacity, codes):
+        # 重寫整組檔案：先寫暫存檔再換名，最後才換 meta.json
+        for column, (dtype, fill) in COLUMNS.items():
+            data = np.full((days, capacity), fill, dtype=dtype)
+            old = self.arrays.get(column)
+            if old is not None:
+                offset = self.start_day - start_day
+                data[offset:offset + self.days, :self.capacity] = old
+            tmp = self._file(column) + ".tmp"
+            data.tofile(tmp)
+            os.replace(tmp, self._file(column))
+        self._write_meta(codes, start_day, days, capacity)
+        self.arrays = {}
+        self._reload()
+
+    def _write_meta(self, codes, start_day, days, capacity):
+        tmp = self._path("meta.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"codes": codes, "start_day": start_day, "days": days, "capacity": capacity}, f)
+        os.replace(tmp, self._path("meta.json"))
+        self._meta_mtime = None
+
+    def _fits(self, day, codes):
+        return (self.start_day is not None and 0 <= day - self.start_day < self.days
+                and len(self.codes) + sum(c not in self._col for c in set(codes)) <= self.capacity)
+
+    def _ensure(self, day, codes):
+        # 確保 day 這一列與所有代號的欄位都存在；回傳 (列, [欄])
+        new_codes = [c for c in dict.fromkeys(codes) if c not in self._col]
+        if new_codes or not self._fits(day, codes):
+            with _file_lock(self._path("meta.lock")):
+                self._reload()  # 拿到鎖之後再確認一次，別的程序可能已經擴充過
+                new_codes = [c for c in dict.fromkeys(codes) if c not in self._col]
+                if not self._fits(day, codes):
+                    start_day, end_day = day, day
+                    if self.start_day is not None:
+                        # 往前補資料時，起始日也多留一段，免得每補一天就重寫
+                        start_day = self.start_day if day >= self.start_day else day - SERIES_DAY_CHUNK + 1
+                        end_day = max(day, self.start_day + self.days - 1)
+                    days = -(-(end_day - start_day + 1) // SERIES_DAY_CHUNK) * SERIES_DAY_CHUNK
+                    capacity = max(self.capacity, -(-(len(self.codes) + len(new_codes)) // SERIES_CODE_CHUNK) * SERIES_CODE_CHUNK)
+                    self._resize(start_day, days, capacity, self.codes + new_codes)
+                elif new_codes:
+                    self._add_codes(new_codes)
+        return day - self.start_day, [self._col[c] for c in codes]
+
+    def _add_codes(self, new_codes):
+        # 預留的欄位還夠：只要改 meta.json
+        self._write_meta(self.codes + new_codes, self.start_day, self.days, self.capacity)
+        self._reload()
+
+    # ---------- 寫入 ----------
+    def record_many(self, rows, day=None):
+        # rows：[(代號, 分數, 評分來源 "AI"/"Fallback", 新聞則數)]；同一天重複寫入以最後一次為準
+        rows = [r for r in rows if r[0] and r[1] is not None]
+        if not rows: return
+        day = day_number(day)
+        with self._lock:
+            self._reload()
+            row, cols = self._ensure(day, [r[0] for r in rows])
+            cols = np.asarray(cols)
+            self.arrays["score"][row, cols] = [float(r[1]) for r in rows]
+            self.arrays["source"][row, cols] = [SOURCE_CODES.get(r[2], 0) for r in rows]
+            self.arrays["count"][row, cols] = [min(int(r[3] or 0), 65535) for r in rows]
+            for array in self.arrays.values():
+                array.flush()
+
+    def record(self, code, score, score_source, news_count, day=None):
+        self.record_many([(code, score, score_source, news_count)], day)
+
+    # ---------- 讀取 ----------
+    def recorded_days(self):
+        # 有任何評分的日期 (date)，新的在前
+        with self._lock:
+            self._reload()
+            if not self.days: return []
+            filled = ~np.isnan(self.arrays["score"][:, :len(self.codes)]).all(axis=1)
+            return [date.fromordinal(self.start_day + int(i)) for i in np.flatnonzero(filled)[::-1]]
+
+    def _window(self, column, end_row, window):
+        # end_row 之前 (不含) 的 window 列，超出範圍的部分補空值
+        dtype, fill = COLUMNS[column]
+        out = np.full((window, len(self.codes)), fill, dtype=dtype)
+        lo = max(0, end_row - window)
+        if end_row > 0:
+            out[window - (end_row - lo):] = self.arrays[column][lo:end_row, :len(self.codes)]
+        return out
+
+    def cross_section(self, day=None, window=ROLLING_WINDOW):
+        # 某一天的全市場橫切面，全部是長度 = 股票數的 numpy 陣列：
+        #   score / count / source、previous (前一次評分)、change、avg (含當天的 N 日均)、
+        #   z (當天分數相對自己前 N 天的 z 分數)、rank (當天分數排名，1 = 最高)
+        day = day_number(day)
+        with self._lock:
+            self._reload()
+            n = len(self.codes)
+            row = day - self.start_day if self.start_day is not None else -1
+            if n == 0 or row < 0 or row >= self.days:
+                empty = np.full(n, np.nan, dtype=np.float32)
+                return {"codes": list(self.codes), "score": empty, "count": np.zeros(n, np.uint16), "source": np.zeros(n, np.uint8),
+                        "previous": empty, "change": empty, "avg": empty, "z": empty, "rank": np.zeros(n, np.int32)}
+            score = np.array(self.arrays["score"][row, :n])
+            count = np.array(self.arrays["count"][row, :n])
+            source = np.array(self.arrays["source"][row, :n])
+            history = self._window("score", row, window).astype(np.float64)
+
+        # 往回找最近一次有分數的日子 (由近到遠，先找到的優先)
+        previous = np.full(n, np.nan)
+        for past in history[::-1][:PREVIOUS_LOOKBACK]:
+            previous = np.where(np.isnan(previous), past, previous)
+
+        valid = ~np.isnan(history)
+        k = valid.sum(axis=0)
+        filled = np.where(valid, history, 0.0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = filled.sum(axis=0) / k
+            std = np.sqrt(np.where(valid, (history - mean) ** 2, 0.0).sum(axis=0) / k)
+            z = np.where((k >= 3) & (std > 0), (score - mean) / std, np.nan)
+            today = ~np.isnan(score)
+            avg = (filled[1:].sum(axis=0) + np.where(today, score, 0.0)) / (valid[1:].sum(axis=0) + today)
+
+        rank = np.zeros(n, np.int32)
+        order = np.argsort(-np.where(np.isnan(score), -np.inf, score), kind="stable")
+        rank[order] = np.arange(1, n + 1)
+        rank[np.isnan(score)] = 0
+        return {"codes": list(self.codes), "score": score, "count": count, "source": source, "previous": previous.astype(np.float32),
+                "change": (score - previous).astype(np.float32), "avg": avg.astype(np.float32), "z": z.astype(np.float32), "rank": rank}
+
+    def rolling_mean(self, window=ROLLING_WINDOW):
+        # 整個矩陣的 N 日均 (略過空值)，(天數, 股票數)
+        with self._lock:
+            self._reload()
+            if not self.days: return np.empty((0, len(self.codes)))
+            return _rolling_mean(self.arrays["score"][:, :len(self.codes)], window)
+
+    def history(self, code, days=90, window=ROLLING_WINDOW, until=None):
+        # 單一股票到 until (預設今天) 為止的 days 天：{"day": [...], "score": [...], "avg": [...]}
+        with self._lock:
+            self._reload()
+            col = self._col.get(code)
+            if col is None: return {"day": [], "score": [], "avg": []}
+            end = min(self.days, day_number(until) - self.start_day + 1)
+            lo = max(0, end - days)
+            if end <= lo: return {"day": [], "score": [], "avg": []}
+            column = np.array(self.arrays["score"][max(0, lo - window):end, col])
+            avg = _rolling_mean(column[:, None], window)[-(end - lo):, 0]
+            return {"day": [date.fromordinal(self.start_day + i) for i in range(lo, end)], "score": column[-(end - lo):], "avg": avg}
+
+
+def _rolling_mean(score, window):
+    # cumsum 一次算完每一列往回 window 天的平均 (略過空值)
+    score = np.asarray(score, dtype=np.float64)
+    valid = ~np.isnan(score)
+    csum = np.vstack([np.zeros((1, score.shape[1])), np.cumsum(np.where(valid, score, 0.0), axis=0)])
+    ccnt = np.vstack([np.zeros((1, score.shape[1])), np.cumsum(valid, axis=0)])
+    lo = np.maximum(np.arange(1, score.shape[0] + 1) - window, 0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (csum[1:] - csum[lo]) / (ccnt[1:] - ccnt[lo])
+
+
+class _file_lock:
+    def __init__(self, path):
+        self.path = path
+
+    def __enter__(self):
+        self._f = open(self.path, "a")
+        if fcntl is not None: fcntl.flock(self._f, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl is not None: fcntl.flock(self._f, fcntl.LOCK_UN)
+        self._f.close()
+
+
+_series = None
+_series_lock = threading.Lock()
+
+
+def get_score_series():
+    global _series
+    with _series_lock:
+        if _series is None:
+            _series = ScoreSeries()
+    return _series
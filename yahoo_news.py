@@ -0,0 +1,99 @@
+import codecs
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+
+import aiohttp
+
+from http_client import get_session
+from metrics import add_bytes
+
+# ===========================
+# 📰 Yahoo 個股新聞頁 (不開瀏覽器)
+# ===========================
+# 個股新聞列表是伺服器端渲染 (SSR) 的，HTML 裡就有 #main-2-QuoteNews-Proxy 的連結，
+# 直接邊下載邊解析，拿夠就停，不載入圖片、字型、廣告與 JS。
+# 頁面改版 (例如改成前端渲染) 解析不到時，呼叫端再退回瀏覽器。
+YAHOO_NEWS_CONTAINER = "main-2-QuoteNews-Proxy"
+YAHOO_CHUNK_SIZE = 16384
+YAHOO_MAX_BYTES = 3 * 1024 * 1024  # 超過還找不到列表就放棄，交給瀏覽器
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+BLOCK_TAGS = {"div", "p", "h1", "h2", "h3", "h4", "h5", "h6", "li", "ul", "section", "article", "header", "footer", "br"}
+
+
+class YahooNewsParser(HTMLParser):
+    # 收集容器內 href 含 /news/ 的連結：[(文字, href), ...]，文字以區塊元素斷行 (同瀏覽器的 inner_text)
+    def __init__(self, base_url):
+        super().__init__(convert_charrefs=True)
+        self.base_url = base_url
+        self.links = []
+        self.container_found = False
+        self._depth = 0      # 目前在容器內的層數，0 代表不在容器內
+        self._anchor = None  # [href, 文字片段]
+        self.finished = False
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if self._depth == 0:
+            if attrs.get("id") == YAHOO_NEWS_CONTAINER:
+                self.container_found = True
+                self._depth = 1
+            return
+        if tag not in VOID_TAGS:
+            self._depth += 1
+        if tag == "a" and "/news/" in (attrs.get("href") or ""):
+            self._anchor = [urljoin(self.base_url, attrs["href"]), []]
+        elif self._anchor is not None and tag in BLOCK_TAGS:
+            self._anchor[1].append("\n")
+
+    def handle_endtag(self, tag):
+        if self._depth == 0 or tag in VOID_TAGS:
+            return
+        if tag == "a" and self._anchor is not None:
+            href, parts = self._anchor
+            self.links.append(("".join(parts), href))
+            self._anchor = None
+        elif self._anchor is not None and tag in BLOCK_TAGS:
+            self._anchor[1].append("\n")
+        self._depth -= 1
+        if self._depth == 0:
+            self.finished = True
+
+    def handle_data(self, data):
+        if self._anchor is not None:
+            self._anchor[1].append(data)
+
+
+def news_from_links(links, limit=3):
+    # 與瀏覽器版相同的規則：取最長的一行當標題，太短或重複的略過
+    data, seen_titles = [], set()
+    for text, href in links:
+        lines = [line.strip() for line in text.split("\n")]
+        title = max(lines, key=len) if lines else ""
+        if len(title) > 5 and title not in seen_titles:
+            seen_titles.add(title)
+            data.append({"title": title, "snippet": "Yahoo 焦點新聞 (最新)", "source": "Yahoo", "link": href})
+        if len(data) >= limit:
+            break
+    return data
+
+
+async def fetch_yahoo_news(url, headers=None, limit=3, timeout=8, meta=None):
+    # 回傳 (新聞清單, 是否找到列表容器)；HTTP 錯誤會丟出 aiohttp.ClientResponseError
+    # meta (dict) 會填入 status / etag / last_modified；304 時回傳 ([], True)，由呼叫端沿用上次的結果
+    parser = YahooNewsParser(url)
+    received = 0
+    async with get_session().get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=timeout)) as resp:
+        resp.raise_for_status()
+        if meta is not None:
+            meta.update(status=resp.status, etag=resp.headers.get("ETag"), last_modified=resp.headers.get("Last-Modified"))
+        if resp.status == 304:
+            return [], True
+        # 多位元組字元可能被切在兩個 chunk 之間，用 incremental decoder 接起來
+        decoder = codecs.getincrementaldecoder(resp.charset or "utf-8")(errors="replace")
+        async for chunk in resp.content.iter_chunked(YAHOO_CHUNK_SIZE):
+            received += len(chunk)
+            add_bytes(len(chunk))
+            parser.feed(decoder.decode(chunk))
+            if parser.finished or len(news_from_links(parser.links, limit)) >= limit or received > YAHOO_MAX_BYTES:
+                break
+    return news_from_links(parser.links, limit), parser.container_found